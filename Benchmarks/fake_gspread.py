@@ -0,0 +1,137 @@
+# fake_gspread.py
+# In-memory stand-in for the parts of gspread the export scripts use.
+# Spreadsheets are created on first open, worksheets keep their cells as
+# native values (USER_ENTERED writes drop the leading apostrophe of quoted
+# text, like Sheets does), reads return them unformatted or as strings, grid
+# bounds are enforced like Sheets does, and every API call is counted so the
+# benchmarks can report requests and cells written.
+import threading
+import time
+import gspread
+from gspread.utils import a1_range_to_grid_range, ValueInputOption, ValueRenderOption
+
+def _entered(value, user_entered: bool):
+    # The value Sheets stores for a written cell
+    if value is None:
+        return ""
+    if user_entered and isinstance(value, str) and value.startswith("'"):
+        return value[1:]
+    return value
+
+def _formatted(value) -> str:
+    # Roughly how Sheets renders a stored value with FORMATTED_VALUE
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+class FakeWorksheet:
+    def __init__(self, client, title: str, rows: int = 1000, cols: int = 26):
+        self.client = client
+        self.title = title
+        self.row_count = int(rows)
+        self.col_count = int(cols)
+        self.cells = []
+
+    def _write(self, range_name: str, values: list, value_input_option=None):
+        user_entered = value_input_option in (ValueInputOption.user_entered, "USER_ENTERED")
+        grid = a1_range_to_grid_range(range_name)
+        first_row, first_col = grid.get("startRowIndex", 0), grid.get("startColumnIndex", 0)
+        if first_row + len(values) > self.row_count or first_col + max((len(r) for r in values), default=0) > self.col_count:
+            raise gspread.exceptions.GSpreadException(f"Range {range_name} exceeds grid limits of '{self.title}'")
+        for i, row in enumerate(values):
+            r = first_row + i
+            while len(self.cells) <= r:
+                self.cells.append([])
+            line = self.cells[r]
+            if len(line) < first_col + len(row):
+                line.extend([""] * (first_col + len(row) - len(line)))
+            line[first_col:first_col + len(row)] = [_entered(v, user_entered) for v in row]
+        self.client.count("cells", sum(len(r) for r in values))
+
+    def get_all_values(self, value_render_option=None, **kwargs) -> list:
+        self.client.count("reads")
+        unformatted = value_render_option in (ValueRenderOption.unformatted, "UNFORMATTED_VALUE")
+        rows = [[v if unformatted or v == "" else _formatted(v) for v in r] for r in self.cells]
+        while rows and not any(v != "" for v in rows[-1]):
+            rows.pop()
+        width = max((len(r) for r in rows), default=0)
+        return [r + [""] * (width - len(r)) for r in rows]
+
+    def resize(self, rows: int = None, cols: int = None):
+        self.client.count("writes")
+        self.row_count = int(rows or self.row_count)
+        self.col_count = int(cols or self.col_count)
+        del self.cells[self.row_count:]
+        for line in self.cells:
+            del line[self.col_count:]
+
+    def update(self, values, range_name: str = "A1", value_input_option=None, **kwargs):
+        self.client.count("writes")
+        self._write(range_name if ":" in range_name else f"{range_name}:{range_name}", values, value_input_option)
+
+    def batch_update(self, data: list, value_input_option=None, **kwargs):
+        self.client.count("writes")
+        for entry in data:
+            self._write(entry["range"], entry["values"], value_input_option)
+
+    def batch_clear(self, ranges: list):
+        self.client.count("writes")
+        for range_name in ranges:
+            grid = a1_range_to_grid_range(range_name)
+            for r in range(grid.get("startRowIndex", 0), min(grid.get("endRowIndex", len(self.cells)), len(self.cells))):
+                line = self.cells[r]
+                for c in range(grid.get("startColumnIndex", 0), min(grid.get("endColumnIndex", len(line)), len(line))):
+                    line[c] = ""
+
+    def clear(self):
+        self.client.count("writes")
+        self.cells = []
+
+class FakeSpreadsheet:
+    def __init__(self, client, title: str):
+        self.client = client
+        self.title = title
+        self.worksheets = {}
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self.client.count("reads")
+        if title not in self.worksheets:
+            raise gspread.WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def add_worksheet(self, title: str, rows, cols, **kwargs) -> FakeWorksheet:
+        self.client.count("writes")
+        self.worksheets[title] = FakeWorksheet(self.client, title, rows, cols)
+        return self.worksheets[title]
+
+class FakeClient:
+    def __init__(self, latency: float = 0.0):
+        """
+        Creates an in-memory gspread client.
+
+        Args:
+            latency (float): Seconds added to every API call, to mimic round trips.
+        """
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.spreadsheets = {}
+        self.counters = {"reads": 0, "writes": 0, "cells": 0}
+
+    def count(self, name: str, amount: int = 1):
+        # Calls are counted per kind; cells only add to the total
+        if name != "cells" and self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.counters[name] += amount
+
+    def reset_counters(self):
+        with self.lock:
+            self.counters = {"reads": 0, "writes": 0, "cells": 0}
+
+    def open(self, title: str) -> FakeSpreadsheet:
+        with self.lock:
+            if title not in self.spreadsheets:
+                self.spreadsheets[title] = FakeSpreadsheet(self, title)
+            return self.spreadsheets[title]
@@ -0,0 +1,349 @@
+# mock_server.py
+# Local stand-in for the Meisterplan and Asana APIs used by the benchmarks.
+# Meisterplan endpoints return {"items": [...], "meta": {"next": url}} pages and
+# Asana endpoints return {"data": [...], "next_page": {...}} pages, with
+# generated records shaped like the real ones. Like the real API, Meisterplan
+# pages only hold the records inside the startDate/finishDate window, and each
+# scenario has its own scenarioProjectIds, values and (fewer) projects, so date
+# shards and scenarios fetch different data. Page size, dataset size, latency
+# and error injection (503s and 429s with Retry-After) are configurable, and
+# request / byte counters let the benchmarks report per-stage traffic.
+import json
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, urlencode
+
+DEFAULT_PAGE_SIZE = 500
+# Meisterplan entity -> number of records
+DEFAULT_DATASET = {
+    "projects": 1000,
+    "allocationSlices": 50000,
+    "financials": 5000,
+    "milestones": 2000,
+    "resources": 250,
+    "scenarios": 3,
+}
+DEFAULT_ASANA_PROJECTS = 200
+DEFAULT_ASANA_MILESTONES = 5
+
+# Dated records are spread over MONTHS months from FIRST_MONTH (2025-07), the
+# Allocations window of exports.toml, so the configured windows return everything
+MONTHS = 30
+FIRST_MONTH = 2025 * 12 + 6
+# Scenarios leave out every SCENARIO_DROP-th project, shifted per scenario
+SCENARIO_DROP = 5
+ROLES = ["Mechanical Engineer", "Electrical Engineer", "Industrial Designer", "Test Engineer",
+         "Product Manager", "Sourcing", "Quality Engineer"]
+PHASES = ["Stage 1: PRFAQ", "Stage 2: BRD", "Stage 3: xRD", "Stage 4: PEC", "Stage 5: FEC",
+          "Stage 6: TKO", "Stage 7: DVT", "Stage 8: PVT"]
+FINANCE_CATEGORIES = ["Tooling", "Certification", "Prototypes"]
+
+def _month(month: int, end: bool = False) -> str:
+    # Month number since FIRST_MONTH -> its first (or last) day as an ISO date
+    year, month = divmod(FIRST_MONTH + month, 12)
+    if not end:
+        return f"{year}-{month + 1:02d}-01"
+    last = [31, 29 if year % 4 == 0 else 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31][month]
+    return f"{year}-{month + 1:02d}-{last}"
+
+def mp_layout(entity: str, i: int, dataset: dict) -> tuple:
+    """
+    Where record number i of an entity sits: its project and its months.
+
+    Returns:
+        tuple: (project, first month, last month), months counted from FIRST_MONTH;
+            (None, None, None) for entities that are not per project or dated.
+    """
+    projects = max(dataset.get("projects", 1), 1)
+    if entity == "projects":
+        return i, i % MONTHS, min(i % MONTHS + 11, MONTHS - 1)
+    if entity == "allocationSlices":
+        # One slice per project, resource and month; consecutive records walk the months
+        month = i % MONTHS
+        return i // MONTHS % projects, month, month
+    if entity == "financials":
+        month = i % MONTHS
+        return i // MONTHS % projects, month, month
+    if entity == "milestones":
+        month = (i % projects + i // projects * 3) % MONTHS
+        return i % projects, month, month
+    return None, None, None
+
+def mp_item(entity: str, i: int, dataset: dict, scenario: int = 0) -> dict:
+    """
+    Deterministic record number i of a Meisterplan entity, with the field names
+    of the real payloads (see the exports in Data/).
+
+    Args:
+        entity (str): API entity, e.g. "allocationSlices".
+        i (int): Record number.
+        dataset (dict): Entity -> number of records.
+        scenario (int): 0 for the Plan of Record, n for the scenario "s<n - 1>".
+
+    Returns:
+        dict: The record.
+    """
+    projects = max(dataset.get("projects", 1), 1)
+    resources = max(dataset.get("resources", 1), 1)
+    project, first, last = mp_layout(entity, i, dataset)
+    prefix = f"s{scenario - 1}-" if scenario else ""
+    scenario_project = f"{prefix}sp{project}"
+    if entity == "projects":
+        return {
+            "scenarioId": f"s{scenario - 1}" if scenario else "por",
+            "scenarioName": f"Scenario {scenario - 1}" if scenario else "Plan of Record",
+            "scenarioProjectId": scenario_project, "projectId": f"p{i}", "projectKey": f"MPP-{i}",
+            "projectName": f"Project {i}", "projectType": "New Product Development",
+            "projectStart": _month(first), "projectFinish": _month(last, True),
+            "projectCostType": "OPEX", "projectStatus": None, "projectRankCategory": "Regular",
+            "projectRank": i + 1, "projectLastChanged": "2025-07-14T17:51:51Z",
+            "projectTotalAllocationsHours": round((i * 37 + scenario * 11) % 2000 * 0.8, 1),
+            "cust_launch_quarter": f"{_month(last)[:4]} Q{(int(_month(last)[5:7]) - 1) // 3 + 1}",
+            "cust_stage_gate": PHASES[i % len(PHASES)], "cust_asana_id": str(100000 + i),
+        }
+    if entity == "allocationSlices":
+        pair = i // (MONTHS * projects)
+        role = (project + pair) % len(ROLES)
+        # Every tenth project/resource pair is an unstaffed role demand
+        if (project + pair) % 10 == 0:
+            resource_type, resource_id, resource_name = "ROLE", f"role{role}", ROLES[role]
+        else:
+            resource_type, resource_id, resource_name = "RESOURCE", f"r{pair % resources}", f"Resource {pair % resources}"
+        hours = float((i * 7 + scenario * 24) % 176)
+        return {
+            "scenarioProjectId": scenario_project, "projectName": f"Project {project}",
+            "resourceType": resource_type, "resourceId": resource_id, "resourceName": resource_name,
+            "allocationProjectRoleId": f"role{role}", "allocationProjectRoleName": ROLES[role],
+            "allocationStart": _month(first), "allocationFinish": _month(first, True),
+            "allocationHours": hours, "allocationFte": round(hours / 168, 6),
+            "allocationCost": 0, "allocationBenefit": 0, "allocationCostType": "OPEX",
+        }
+    if entity == "financials":
+        category = FINANCE_CATEGORIES[i // (MONTHS * projects) % len(FINANCE_CATEGORIES)]
+        return {
+            "scenarioProjectId": scenario_project, "financialsDate": _month(first, True),
+            "financialsValue": round((i * 1337 + scenario * 500) % 100000, 2),
+            "financialsFinanceType": "CAPEX", "financeCategoryName": category,
+            "financialsDescription": f"{category} payment - Project {project}",
+        }
+    if entity == "milestones":
+        gate = i // projects
+        return {
+            "scenarioProjectId": scenario_project, "scenarioMilestoneId": f"{prefix}sm{i}", "milestoneId": f"m{i}",
+            "milestoneName": f"Gate {gate + 1}", "milestoneDate": _month(first),
+            "projectPhaseName": PHASES[gate % len(PHASES)], "projectPhaseColor": "#1fe7fd",
+        }
+    if entity == "resources":
+        return {
+            "resourceId": f"r{i}", "resourceName": f"Resource {i}", "resourceType": "RESOURCE",
+            "teamId": f"t{i % 12}", "teamName": f"Team {i % 12}",
+        }
+    if entity == "scenarios":
+        return {"scenarioId": f"s{i}", "scenarioName": f"Scenario {i}"}
+    return {"id": f"{entity}{i}"}
+
+def _months_between(start: str, finish: str) -> tuple:
+    # startDate/finishDate query values -> month numbers since FIRST_MONTH
+    def number(value):
+        return int(value[:4]) * 12 + int(value[5:7]) - 1 - FIRST_MONTH
+    return number(start) if start else -10**6, number(finish) if finish else 10**6
+
+class MockServer:
+    def __init__(self, page_size: int = DEFAULT_PAGE_SIZE, dataset: dict = None, latency: float = 0.0,
+                 error_rate: float = 0.0, asana_projects: int = DEFAULT_ASANA_PROJECTS,
+                 asana_milestones: int = DEFAULT_ASANA_MILESTONES, seed: int = 0):
+        """
+        Configures the mock API server.
+
+        Args:
+            page_size (int): Meisterplan records per page (Asana uses the request's limit).
+            dataset (dict): Meisterplan entity -> number of records, see DEFAULT_DATASET.
+            latency (float): Seconds added to every response.
+            error_rate (float): Share of requests answered with a 503 or a 429, 0-1.
+            asana_projects (int): Projects in the Asana portfolio.
+            asana_milestones (int): Milestones per Asana project.
+            seed (int): Seed for error injection, so runs are repeatable.
+        """
+        self.page_size = page_size
+        self.dataset = {**DEFAULT_DATASET, **(dataset or {})}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.asana_projects = asana_projects
+        self.asana_milestones = asana_milestones
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+        # (entity, scenario, startDate, finishDate) -> record numbers in that window
+        self.selections = {}
+        self.reset_counters()
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = 0
+            self.errors = 0
+            self.bytes_sent = 0
+
+    def counters(self) -> dict:
+        with self.lock:
+            return {"requests": self.requests, "errors": self.errors, "bytes": self.bytes_sent}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        """
+        Starts serving on a free local port in a background thread.
+
+        Returns:
+            str: Base URL; Meisterplan lives at <url>/mp and Asana at <url>/asana.
+        """
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                mock.handle(self)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, request):
+        # Dispatches one GET, injecting latency and errors first
+        if self.latency:
+            threading.Event().wait(self.latency)
+        with self.lock:
+            self.requests += 1
+            fail = self.error_rate and self.random.random() < self.error_rate
+            status = self.random.choice((429, 503)) if fail else 200
+            if fail:
+                self.errors += 1
+
+        if status != 200:
+            self.send(request, {"errors": [{"message": "injected failure"}]}, status)
+            return
+
+        parsed = urlparse(request.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        parts = parsed.path.strip("/").split("/")
+        if parts[0] == "mp":
+            page = self.mp_page(parts[-1], query, parsed.path)
+            self.send(request, page, 404 if "errors" in page else 200)
+        elif parts[0] == "asana" and parts[1] == "portfolios":
+            self.send(request, self.asana_portfolio_page(query))
+        elif parts[0] == "asana" and parts[-1] == "search":
+            self.send(request, self.asana_search_page(query))
+        else:
+            self.send(request, {"errors": [{"message": "not found"}]}, 404)
+
+    def send(self, request, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            request.send_header("Retry-After", "0")
+        request.end_headers()
+        request.wfile.write(body)
+        with self.lock:
+            self.bytes_sent += len(body)
+
+    def mp_page(self, entity: str, query: dict, path: str) -> dict:
+        # Meisterplan page: the records of the scenario inside the startDate/finishDate
+        # window, plus an absolute meta.next URL while records remain
+        scenario = self.scenario_number(query.get("scenario"))
+        if scenario is None:
+            return {"errors": [{"message": f"unknown scenario {query['scenario']}"}]}
+        selection = self.select(entity, scenario, query.get("startDate"), query.get("finishDate"))
+        offset = int(query.get("offset", 0))
+        items = [mp_item(entity, i, self.dataset, scenario) for i in selection[offset:offset + self.page_size]]
+        meta = {}
+        if offset + self.page_size < len(selection):
+            meta["next"] = f"{self.url}{path}?{urlencode({**query, 'offset': offset + self.page_size})}"
+        return {"items": items, "meta": meta}
+
+    def scenario_number(self, scenario_id: str):
+        # 0 for the Plan of Record, n for "s<n - 1>", None for an unknown scenario
+        if not scenario_id:
+            return 0
+        ids = [f"s{i}" for i in range(self.dataset.get("scenarios", 0))]
+        return ids.index(scenario_id) + 1 if scenario_id in ids else None
+
+    def select(self, entity: str, scenario: int, start: str, finish: str) -> list:
+        # Record numbers of the scenario that overlap the window, computed once per window
+        key = (entity, scenario, start, finish)
+        with self.lock:
+            if key in self.selections:
+                return self.selections[key]
+        first, last = _months_between(start, finish)
+        selection = []
+        for i in range(self.dataset.get(entity, 0)):
+            project, begins, ends = mp_layout(entity, i, self.dataset)
+            if project is None:
+                selection.append(i)
+            elif begins <= last and ends >= first and not (scenario and (project + scenario) % SCENARIO_DROP == 0):
+                selection.append(i)
+        with self.lock:
+            self.selections[key] = selection
+        return selection
+
+    def asana_portfolio_page(self, query: dict) -> dict:
+        # Portfolio items with offset pagination
+        limit = int(query.get("limit", 20))
+        offset = int(query.get("offset", 0))
+        data = [
+            {
+                "gid": str(100000 + i),
+                "name": f"Asana Project {i}",
+                "permalink_url": f"https://app.asana.com/0/{100000 + i}",
+                "custom_fields": [
+                    {"name": "MP Mapping", "display_value": f"MPP-{i}"},
+                    {"name": "Product Stage", "enum_value": {"name": ["Concept", "Build", "Launch"][i % 3]}},
+                    {"name": "PD Proj Status", "display_value": "On track"},
+                ],
+            }
+            for i in range(offset, min(offset + limit, self.asana_projects))
+        ]
+        next_page = {"offset": str(offset + limit)} if offset + limit < self.asana_projects else None
+        return {"data": data, "next_page": next_page}
+
+    def asana_search_page(self, query: dict) -> dict:
+        # Milestone search: no offsets, sorted by created_at and filtered with created_at.after
+        limit = int(query.get("limit", 20))
+        project = query.get("projects.any", "0")
+        after = query.get("created_at.after", "")
+        milestones = [
+            {
+                "gid": f"{project}-{i}",
+                "name": f"Milestone {i}",
+                "due_on": f"2026-{i % 12 + 1:02d}-01",
+                "completed": i % 2 == 0,
+                "permalink_url": f"https://app.asana.com/0/{project}/{i}",
+                "created_at": f"2025-01-01T00:00:00.{i:06d}Z",
+            }
+            for i in range(self.asana_milestones)
+        ]
+        return {"data": [m for m in milestones if m["created_at"] > after][:limit]}
@@ -0,0 +1,258 @@
+# run_benchmarks.py
+# Benchmarks the export pipeline against a local mock API and a fake gspread backend.
+# Each stage (Meisterplan fetch, DataFrame build, concurrent fetch, Excel,
+# Parquet, Excel + Sheets together, Google Sheets upload and rewrite, Asana
+# fetch) reports wall time, rows, rows/s, HTTP requests and bytes, Sheets
+# calls and peak Python memory.
+# Results are appended to Benchmarks/results.jsonl together with the git commit,
+# and compared with the previous run of the same configuration so regressions show up.
+#
+# Usage:
+#   python Benchmarks/run_benchmarks.py
+#   python Benchmarks/run_benchmarks.py --rows 200000 --latency 0.02 --error-rate 0.01 --label "after pool change"
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.abspath(os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, os.path.join(BASE_DIR, "Scripts"))
+
+from fake_gspread import FakeClient
+from mock_server import DEFAULT_ASANA_MILESTONES, DEFAULT_ASANA_PROJECTS, DEFAULT_PAGE_SIZE, MockServer
+
+DEFAULT_RESULTS_PATH = os.path.join(BENCH_DIR, "results.jsonl")
+DEFAULT_ROWS = 50000
+STAGES = ["mp_fetch", "dataframe", "mp_fetch_concurrent", "excel", "parquet", "outputs_both", "gsheets_upload", "gsheets_rewrite", "asana_fetch"]
+
+def dataset_for(rows: int) -> dict:
+    # Entity sizes scaled from the number of allocation slices
+    return {
+        "allocationSlices": rows,
+        "projects": max(rows // 50, 10),
+        "financials": max(rows // 10, 10),
+        "milestones": max(rows // 25, 10),
+        "resources": max(rows // 200, 10),
+    }
+
+def configure_environment(url: str):
+    # The scripts read their settings from the environment (see Scripts/config.py)
+    os.environ.update({
+        "MP_URL": f"{url}/mp",
+        "MP_TOKEN": "benchmark",
+        "ASANA_URL": f"{url}/asana",
+        "Asana_TOKEN": "benchmark",
+        "Asana_WorkID": "workspace",
+        "Asana_PortID": "portfolio",
+    })
+
+def git_commit() -> str:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class StageTimer:
+    def __init__(self, server: MockServer, sheets: FakeClient, trace_memory: bool = True):
+        self.server = server
+        self.sheets = sheets
+        self.trace_memory = trace_memory
+        self.results = {}
+
+    def run(self, name: str, func, *args, **kwargs):
+        """
+        Runs one stage and records its metrics.
+
+        Args:
+            name (str): Stage name.
+            func: Callable returning (result, rows).
+
+        Returns:
+            The stage's result.
+        """
+        self.server.reset_counters()
+        self.sheets.reset_counters()
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            result, rows = func(*args, **kwargs)
+        finally:
+            wall = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+            if self.trace_memory:
+                tracemalloc.stop()
+
+        http = self.server.counters()
+        self.results[name] = {
+            "wall_s": round(wall, 4),
+            "rows": rows,
+            "rows_per_s": round(rows / wall, 1) if wall else None,
+            "requests": http["requests"],
+            "http_errors": http["errors"],
+            "bytes": http["bytes"],
+            "sheets_reads": self.sheets.counters["reads"],
+            "sheets_writes": self.sheets.counters["writes"],
+            "sheets_cells": self.sheets.counters["cells"],
+            "peak_mb": round(peak / 1e6, 1) if peak is not None else None,
+        }
+        print(f"  {name:<20} {wall:8.3f}s  {rows:>9} rows")
+        return result
+
+def run(args) -> dict:
+    server = MockServer(
+        page_size=args.page_size,
+        dataset=dataset_for(args.rows),
+        latency=args.latency,
+        error_rate=args.error_rate,
+        asana_projects=args.asana_projects,
+        asana_milestones=args.asana_milestones,
+    )
+    sheets = FakeClient(latency=args.sheets_latency)
+
+    with server:
+        configure_environment(server.url)
+        # Imported only now that the environment points at the mock server
+        import pandas as pd
+        import api_client
+        import config
+        import exports
+        import get_allMPdata
+        import get_AsanaTime
+        import sheets_writer
+        from mp_schema import apply_schema, entity_for, flatten_nested
+
+        # Measure our own code, not Google's per-minute quota
+        sheets_writer._pacer = sheets_writer.WritePacer(args.sheets_quota)
+
+        timer = StageTimer(server, sheets, not args.no_memory)
+        tabs = exports.load().tabs
+        print(f"Benchmarking {args.rows} allocation rows, page size {args.page_size}, latency {args.latency}s")
+
+        def mp_fetch():
+            items = {name: api_client.fetch_paginated(config.mp_url(), tab.endpoint, config.mp_headers()) for name, tab in tabs.items()}
+            return items, sum(len(v) for v in items.values())
+        items = timer.run("mp_fetch", mp_fetch)
+
+        def build_frames():
+            frames = {name: apply_schema(entity_for(tabs[name].endpoint), tabs[name].project(flatten_nested(pd.DataFrame(v)))) for name, v in items.items()}
+            return frames, sum(len(df) for df in frames.values())
+        dataframes = timer.run("dataframe", build_frames)
+        del items
+
+        def fetch_concurrent():
+            frames = get_allMPdata.fetch_all_endpoints(tabs, None, args.workers)
+            return frames, sum(len(df) for df in frames.values())
+        timer.run("mp_fetch_concurrent", fetch_concurrent)
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            def excel():
+                get_allMPdata.write_to_excel(dataframes, output_dir, "bench", args.excel_engine)
+                return None, sum(len(df) for df in dataframes.values())
+            timer.run("excel", excel)
+
+            def parquet():
+                get_allMPdata.write_to_files(dataframes, "parquet", output_dir, "bench")
+                return None, sum(len(df) for df in dataframes.values())
+            timer.run("parquet", parquet)
+
+            # Excel and a fresh Sheets upload together: should take about as long as the slower of the two
+            def outputs_both():
+                get_allMPdata.write_outputs({"PoR": dataframes}, "both", {"PoR": None}, sheets, excel_engine=args.excel_engine, output_dir=output_dir)
+                return None, sum(len(df) for df in dataframes.values())
+            timer.run("outputs_both", outputs_both)
+
+        def gsheets():
+            get_allMPdata.write_to_gsheets(sheets, "Benchmark", dataframes)
+            return None, sum(len(df) for df in dataframes.values())
+        timer.run("gsheets_upload", gsheets)
+        # Same data again: measures the diff path when nothing changed
+        timer.run("gsheets_rewrite", gsheets)
+
+        def asana_fetch():
+            projects = get_AsanaTime.iter_proj_in_port(config.asana_ids()[1])
+            rows = get_AsanaTime.ready_asana_data_for_sheet(
+                get_AsanaTime.fetch_portfolio_data(projects, args.asana_workers), get_AsanaTime.CUSTOM_FIELDS_LIST
+            )
+            return rows, len(rows) - 1
+        timer.run("asana_fetch", asana_fetch)
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "label": args.label,
+        "config": {
+            "rows": args.rows,
+            "page_size": args.page_size,
+            "latency": args.latency,
+            "error_rate": args.error_rate,
+            "workers": args.workers,
+            "asana_projects": args.asana_projects,
+            "asana_milestones": args.asana_milestones,
+            "asana_workers": args.asana_workers,
+            "excel_engine": args.excel_engine,
+            "sheets_latency": args.sheets_latency,
+            "memory": not args.no_memory,
+        },
+        "stages": timer.results,
+    }
+
+def previous_result(results_path: str, config: dict) -> dict:
+    # Most recent stored run with the same configuration
+    if not os.path.exists(results_path):
+        return None
+    previous = None
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                if result.get("config") == config:
+                    previous = result
+    return previous
+
+def print_report(result: dict, previous: dict = None):
+    print(f"\n{'stage':<20} {'wall s':>9} {'rows/s':>11} {'requests':>9} {'MB sent':>8} {'sheet calls':>11} {'peak MB':>8} {'vs prev':>8}")
+    for name, stage in result["stages"].items():
+        change = ""
+        if previous and name in previous["stages"] and previous["stages"][name]["wall_s"]:
+            change = f"{(stage['wall_s'] / previous['stages'][name]['wall_s'] - 1) * 100:+.0f}%"
+        sheet_calls = stage["sheets_reads"] + stage["sheets_writes"]
+        peak = "" if stage["peak_mb"] is None else stage["peak_mb"]
+        print(f"{name:<20} {stage['wall_s']:>9.3f} {stage['rows_per_s'] or 0:>11.0f} {stage['requests']:>9} "
+              f"{stage['bytes'] / 1e6:>8.1f} {sheet_calls:>11} {peak:>8} {change:>8}")
+    if previous:
+        print(f"\nCompared with {previous['timestamp']} (commit {previous.get('commit')}, label {previous.get('label')!r})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the export pipeline against a local mock API.")
+    parser.add_argument("-r", "--rows", type=int, default=DEFAULT_ROWS, help=f"Allocation slices in the mock dataset; other entities scale with it (default: {DEFAULT_ROWS}).")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help=f"Meisterplan records per page (default: {DEFAULT_PAGE_SIZE}).")
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds added to every API response (default: 0.005).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of API requests answered with 429/503 (default: 0).")
+    parser.add_argument("-w", "--workers", type=int, default=5, help="Concurrent endpoint fetches (default: 5).")
+    parser.add_argument("--asana-projects", type=int, default=DEFAULT_ASANA_PROJECTS, help=f"Projects in the mock Asana portfolio (default: {DEFAULT_ASANA_PROJECTS}).")
+    parser.add_argument("--asana-milestones", type=int, default=DEFAULT_ASANA_MILESTONES, help=f"Milestones per Asana project (default: {DEFAULT_ASANA_MILESTONES}).")
+    parser.add_argument("--asana-workers", type=int, default=10, help="Concurrent Asana milestone requests (default: 10).")
+    parser.add_argument("--excel-engine", choices=["openpyxl", "xlsxwriter"], default="openpyxl", help="Excel engine (default: openpyxl).")
+    parser.add_argument("--sheets-latency", type=float, default=0.0, help="Seconds added to every fake Sheets call (default: 0).")
+    parser.add_argument("--sheets-quota", type=int, default=1000000, help="Sheets writes per minute allowed by the pacer (default: effectively unlimited).")
+    parser.add_argument("--no-memory", action="store_true", help="Skip peak memory tracing, which slows down allocation-heavy stages.")
+    parser.add_argument("--label", help="Free-text label stored with the results.")
+    parser.add_argument("--results", default=DEFAULT_RESULTS_PATH, help="JSON lines file results are appended to.")
+    parser.add_argument("--no-save", action="store_true", help="Print the results without storing them.")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result, previous_result(args.results, result["config"]))
+
+    if not args.no_save:
+        with open(args.results, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result) + "\n")
+        print(f"Results appended to {args.results}")
@@ -0,0 +1,282 @@
+# api_client.py
+# Shared HTTP client for the Meisterplan and Asana scripts.
+# All requests go through one pooled session so TLS connections are reused
+# across pages and endpoints, rate limits (429 / Retry-After) and server
+# errors (5xx) are retried with exponential backoff, and anything that still
+# fails raises instead of returning a partial result. Bodies are decoded with
+# orjson when it is installed (several times faster on large pages).
+# One process-wide limit caps the requests in flight, however many scenario,
+# endpoint and shard threads are waiting on them. The connection pool is sized
+# for the largest limit seen so far, so jobs with different limits (e.g. the
+# daemon's Meisterplan and Asana runs) keep sharing one warm session.
+import json
+import threading
+import requests
+import run_metrics
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 1  # sleeps 1s, 2s, 4s, 8s... between retries
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Requests in flight at once unless set_max_in_flight changes it; pooled connections
+# (grown, never shrunk, when a larger limit is set)
+POOL_SIZE = 16
+TIMEOUT = 60
+
+# Available JSON decoders; the fastest one is used unless set_decoder picks another
+DECODERS = {"json": json.loads}
+if orjson is not None:
+    DECODERS["orjson"] = orjson.loads
+_loads = DECODERS.get("orjson", json.loads)
+
+_session = None
+_session_lock = threading.Lock()
+_pool_size = POOL_SIZE
+_in_flight = threading.BoundedSemaphore(POOL_SIZE)
+_cache = None
+_checkpoints = None
+
+def set_cache(cache):
+    """
+    Routes all GETs through a response cache for incremental syncs.
+
+    Args:
+        cache (ResponseCache): Cache to use, or None to disable caching.
+    """
+    global _cache
+    _cache = cache
+
+def set_checkpoints(store):
+    """
+    Saves every Meisterplan page to a checkpoint, and resumes walks from one.
+
+    Args:
+        store (CheckpointStore): Checkpoints to use, or None to disable them.
+    """
+    global _checkpoints
+    _checkpoints = store
+
+def set_decoder(name: str):
+    """
+    Selects the JSON decoder for API bodies and spill files.
+
+    Args:
+        name (str): A key of DECODERS, e.g. "orjson" or "json".
+
+    Raises:
+        ValueError: If that decoder is not installed.
+    """
+    global _loads
+    if name not in DECODERS:
+        raise ValueError(f"JSON decoder '{name}' is not available (installed: {', '.join(DECODERS)})")
+    _loads = DECODERS[name]
+
+def set_max_in_flight(limit: int):
+    """
+    Caps the requests in flight across all threads. The shared session is kept;
+    it is only rebuilt when the limit is larger than its connection pool.
+
+    Args:
+        limit (int): Maximum concurrent requests (at least 1).
+    """
+    global _pool_size, _in_flight, _session
+    limit = max(1, int(limit))
+    with _session_lock:
+        _in_flight = threading.BoundedSemaphore(limit)
+        if limit <= _pool_size:
+            return
+        _pool_size = limit
+        # Rebuilt with the larger pool on next use
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def loads(data):
+    # Decodes JSON text or bytes with the selected decoder
+    return _loads(data)
+
+def get_session() -> requests.Session:
+    """
+    Returns the shared requests session, creating it on first use.
+
+    Returns:
+        requests.Session: Session with connection pooling, compression and retries.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=MAX_RETRIES,
+                backoff_factor=BACKOFF_FACTOR,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=["GET"],
+                respect_retry_after_header=True,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=_pool_size, pool_maxsize=_pool_size, max_retries=retry)
+
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Accept-Encoding": "gzip, deflate"})
+            _session = session
+    return _session
+
+def _get(url: str, headers: dict, params: dict) -> requests.Response:
+    # One request, counted against the in-flight limit (retries included)
+    with _in_flight:
+        response = get_session().get(url, headers=headers, params=params, timeout=TIMEOUT)
+    run_metrics.record_request(response)
+    return response
+
+def get_json(url: str, headers: dict = None, params: dict = None):
+    """
+    GETs a URL through the shared session and decodes the JSON body.
+
+    Args:
+        url (str): Full URL to request.
+        headers (dict): Request headers (auth, accept).
+        params (dict): Optional query string parameters.
+
+    Returns:
+        The decoded JSON body.
+
+    Raises:
+        requests.HTTPError: If the response is still not successful after all retries.
+    """
+    if _cache is None:
+        response = _get(url, headers, params)
+    else:
+        # Ask for the page only if it changed since it was cached
+        cache_key = requests.Request("GET", url, params=params).prepare().url
+        request_headers = {**(headers or {}), **_cache.conditional_headers(cache_key)}
+        response = _get(url, request_headers, params)
+        if response.status_code == 304:
+            return _loads(_cache.load(cache_key))
+        if response.status_code == 200:
+            _cache.store(cache_key, response)
+
+    if response.status_code != 200:
+        print(f"Request failed: {response.status_code} {url}")
+        print(response.text)
+        response.raise_for_status()
+    try:
+        return _loads(response.content)
+    except ValueError as e:
+        # Same failure type as the HTTP errors, so callers handle both alike
+        raise requests.exceptions.InvalidJSONError(f"Invalid JSON from {url}: {e}", response=response) from e
+
+# Generic Meisterplan fetchers to support pagination
+def iter_pages(base_url: str, endpoint: str, headers: dict, scenario_id=None):
+    """
+    Yields the items of a Meisterplan endpoint one page at a time by following meta.next.
+
+    Args:
+        base_url (str): Meisterplan API base URL (MP_URL).
+        endpoint (str): Endpoint path, optionally with a query string.
+        headers (dict): Request headers including the bearer token.
+        scenario_id (str): Optional scenario ID; the Plan of Record is used if omitted.
+
+    Yields:
+        list: The items of each page, as soon as the page arrives.
+    """
+    url = f"{base_url}/{endpoint}"
+    if scenario_id:
+        if '?' in url:
+            url += f"&scenario={scenario_id}"
+        else:
+            url += f"?scenario={scenario_id}"
+
+    # Resumed walks replay the saved pages and continue from the saved cursor
+    checkpoint = _checkpoints.open(url) if _checkpoints else None
+    if checkpoint:
+        yield from checkpoint.replay()
+        url = checkpoint.cursor
+
+    try:
+        while url:
+            data = get_json(url, headers=headers)
+            items = data if isinstance(data, list) else data.get("items", [])
+
+            url = data.get("meta", {}).get("next") if isinstance(data, dict) else None
+            if url and not url.startswith("http"):
+                url = base_url + url
+            # Saved before it is handed on, so a crash costs at most the page in flight
+            if checkpoint:
+                checkpoint.save(items, url)
+            yield items
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+def fetch_paginated(base_url: str, endpoint: str, headers: dict, scenario_id=None) -> list:
+    """
+    Fetches every page of a Meisterplan endpoint into a single list.
+
+    Args:
+        base_url (str): Meisterplan API base URL (MP_URL).
+        endpoint (str): Endpoint path, optionally with a query string.
+        headers (dict): Request headers including the bearer token.
+        scenario_id (str): Optional scenario ID; the Plan of Record is used if omitted.
+
+    Returns:
+        list: All items across all pages.
+    """
+    all_items = []
+    for items in iter_pages(base_url, endpoint, headers, scenario_id):
+        all_items.extend(items)
+    return all_items
+
+def spill_paginated(base_url: str, endpoint: str, headers: dict, filepath: str, scenario_id=None) -> int:
+    """
+    Streams every page of a Meisterplan endpoint to a newline-delimited JSON file.
+    Only one page is held in memory at a time.
+
+    Args:
+        base_url (str): Meisterplan API base URL (MP_URL).
+        endpoint (str): Endpoint path, optionally with a query string.
+        headers (dict): Request headers including the bearer token.
+        filepath (str): NDJSON file to write, replaced if it exists.
+        scenario_id (str): Optional scenario ID; the Plan of Record is used if omitted.
+
+    Returns:
+        int: Number of items written.
+    """
+    row_count = 0
+    with open(filepath, "w", encoding="utf-8") as f:
+        for items in iter_pages(base_url, endpoint, headers, scenario_id):
+            for item in items:
+                f.write(json.dumps(item, separators=(",", ":")))
+                f.write("\n")
+            row_count += len(items)
+    return row_count
+
+# Asana fetcher to support offset pagination
+def iter_asana_pages(url: str, headers: dict, params: dict = None, limit: int = 100):
+    """
+    Yields the data of an Asana collection one page at a time by following next_page.offset.
+
+    Args:
+        url (str): Full collection URL.
+        headers (dict): Request headers including the bearer token.
+        params (dict): Optional query string parameters (opt_fields, filters).
+        limit (int): Page size, 1-100.
+
+    Yields:
+        list: The records of each page, as soon as the page arrives.
+    """
+    params = {**(params or {}), "limit": limit}
+    while True:
+        data = get_json(url, headers=headers, params=params)
+        yield data.get("data", [])
+
+        next_page = data.get("next_page")
+        if not next_page or not next_page.get("offset"):
+            break
+        params = {**params, "offset": next_page["offset"]}
@@ -0,0 +1,158 @@
+# checkpoints.py
+# Page-level checkpoints for resumable Meisterplan exports.
+# Every page fetched by api_client.iter_pages is appended to a file for its
+# endpoint and scenario, together with the meta.next cursor that follows it.
+# When a run dies halfway through a long walk (network blip, expired token),
+# the next run with --resume replays the saved pages from disk and continues
+# from the saved cursor, so at most the page in flight is fetched again.
+#
+# Layout: one NDJSON file per endpoint URL in the checkpoint directory. The
+# first line records the URL, every further line is {"items": [...], "next": url}.
+# A last line with "next": null marks the endpoint as complete.
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_CHECKPOINT_DIR = os.path.join(BASE_DIR, "Checkpoints")
+# Older checkpoints are discarded rather than mixed with fresh pages
+MAX_AGE_HOURS = 24
+
+class PageCheckpoint:
+    def __init__(self, filepath: str, url: str, max_age_hours: float = MAX_AGE_HOURS):
+        """
+        Opens the checkpoint of one endpoint walk.
+
+        Args:
+            filepath (str): NDJSON file holding the pages.
+            url (str): First page URL; a file saved for another URL is not reused.
+            max_age_hours (float): Saved pages older than this are discarded.
+        """
+        self.filepath = filepath
+        self.url = url
+        self.cursor = url
+        self.saved_pages = 0
+        self.file = None
+
+        fresh = os.path.exists(filepath) and time.time() - os.path.getmtime(filepath) < max_age_hours * 3600
+        if fresh:
+            self._load()
+        if self.saved_pages == 0:
+            self._start()
+
+    def _load(self):
+        # Reads the saved cursor; a line cut off by a crash is dropped along with everything after it
+        good_offset = 0
+        with open(self.filepath, "rb") as f:
+            header = f.readline()
+            try:
+                if json.loads(header).get("url") != self.url:
+                    return
+            except ValueError:
+                return
+            good_offset = f.tell()
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    page = json.loads(line)
+                except ValueError:
+                    break
+                good_offset += len(line)
+                self.saved_pages += 1
+                self.cursor = page.get("next")
+
+        if self.saved_pages:
+            with open(self.filepath, "r+b") as f:
+                f.truncate(good_offset)
+            if self.cursor:
+                self.file = open(self.filepath, "a", encoding="utf-8")
+
+    def _start(self):
+        self.cursor = self.url
+        self.saved_pages = 0
+        self.file = open(self.filepath, "w", encoding="utf-8")
+        self.file.write(json.dumps({"url": self.url}) + "\n")
+        self.file.flush()
+
+    def replay(self):
+        """
+        Yields the items of the saved pages, one page at a time.
+
+        Yields:
+            list: The items of each saved page.
+        """
+        if not self.saved_pages:
+            return
+        with open(self.filepath, encoding="utf-8") as f:
+            f.readline()
+            for _ in range(self.saved_pages):
+                yield json.loads(f.readline())["items"]
+
+    def save(self, items: list, next_url: str):
+        # Appends a page and its follow-up cursor; flushed so a crash can't lose it
+        self.file.write(json.dumps({"items": items, "next": next_url}, separators=(",", ":")) + "\n")
+        self.file.flush()
+        self.cursor = next_url
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+class CheckpointStore:
+    def __init__(self, directory: str = DEFAULT_CHECKPOINT_DIR):
+        """
+        Directory of page checkpoints for one export configuration.
+
+        Args:
+            directory (str): Where the checkpoint files live.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.lock = threading.Lock()
+
+        # Per-run counters
+        self.resumed_pages = 0
+        self.resumed_endpoints = 0
+
+    def path_for(self, url: str) -> str:
+        # Readable, unique file name: entity, scenario and a hash of the full URL
+        parsed = urlparse(url)
+        entity = parsed.path.rstrip("/").rsplit("/", 1)[-1] or "root"
+        scenario = parse_qs(parsed.query).get("scenario", ["PoR"])[0]
+        digest = hashlib.blake2b(url.encode(), digest_size=5).hexdigest()
+        return os.path.join(self.directory, f"{entity}_{scenario}_{digest}.ndjson")
+
+    def open(self, url: str) -> PageCheckpoint:
+        """
+        Opens the checkpoint for the walk starting at url.
+
+        Args:
+            url (str): First page URL.
+
+        Returns:
+            PageCheckpoint: Saved pages (if resuming) and the cursor to continue from.
+        """
+        checkpoint = PageCheckpoint(self.path_for(url), url)
+        if checkpoint.saved_pages:
+            with self.lock:
+                self.resumed_pages += checkpoint.saved_pages
+                self.resumed_endpoints += 1
+        return checkpoint
+
+    def clear(self):
+        clear(self.directory)
+
+def clear(directory: str = DEFAULT_CHECKPOINT_DIR):
+    # Removes the checkpoint files once an export has completed, and the directory if that empties it
+    if not os.path.isdir(directory):
+        return
+    for path in glob.glob(os.path.join(directory, "*.ndjson")):
+        os.remove(path)
+    if not os.listdir(directory):
+        os.rmdir(directory)
@@ -0,0 +1,85 @@
+# config.py
+# Settings from the environment / .env file, loaded on first use.
+# Importing a script no longer reads .env, validates it or exits; the
+# functions below do that when a code path actually needs the value, and raise
+# ConfigError (a clear message for the CLI) when something is missing.
+import os
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SCENARIO_PREFIX = "MP_SCENARIO_"
+
+_loaded = False
+
+class ConfigError(Exception):
+    pass
+
+def load():
+    # Reads .env into the environment once; variables already set win
+    global _loaded
+    if not _loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _loaded = True
+
+def get(name: str, default: str = None) -> str:
+    load()
+    return os.getenv(name, default)
+
+def require(*names: str) -> list:
+    """
+    Returns the values of required settings.
+
+    Args:
+        *names (str): Environment variable names.
+
+    Returns:
+        list: The values, in the same order as names.
+
+    Raises:
+        ConfigError: If any of them is missing or empty.
+    """
+    values = [get(name) for name in names]
+    missing = [name for name, value in zip(names, values) if not value]
+    if missing:
+        raise ConfigError(f"Missing {', '.join(missing)} in .env")
+    return values
+
+def _bearer(token: str) -> dict:
+    return {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/json"
+    }
+
+def mp_url() -> str:
+    return require("MP_URL")[0]
+
+def mp_headers() -> dict:
+    return _bearer(require("MP_TOKEN")[0])
+
+def asana_url() -> str:
+    return require("ASANA_URL")[0]
+
+def asana_headers() -> dict:
+    return _bearer(require("Asana_TOKEN")[0])
+
+def asana_ids() -> tuple:
+    # (workspace gid, portfolio gid)
+    workspace_id, portfolio_id = require("Asana_WorkID", "Asana_PortID")
+    return workspace_id, portfolio_id
+
+def scenario_aliases() -> dict:
+    # MP_SCENARIO_<ALIAS>=<scenario id> entries, keyed by lower-case alias
+    load()
+    return {
+        key[len(SCENARIO_PREFIX):].lower(): value
+        for key, value in os.environ.items()
+        if key.startswith(SCENARIO_PREFIX)
+    }
+
+def resolve_scenario(scenario_input: str) -> str:
+    # Alias from .env or a direct scenario ID
+    aliases = scenario_aliases()
+    if scenario_input in aliases:
+        print(f"Found alias '{scenario_input}'. Using Scenario ID: {aliases[scenario_input]}")
+        return aliases[scenario_input]
+    return scenario_input
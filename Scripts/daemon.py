@@ -0,0 +1,188 @@
+# daemon.py
+# Runs the Meisterplan export and the Asana sync in one long-lived process
+# instead of from cron. The pooled HTTP session (api_client) and the
+# authenticated gspread client are created once and reused, so a refresh no
+# longer pays for interpreter startup, imports, the OAuth token load or new TLS
+# handshakes. Each sync has its own interval; runs never overlap, and a run
+# whose data hashes the same as the previous one writes nothing. The exports
+# config (exports.toml) is read again on every run, so edits need no restart.
+#
+# Usage:
+#   python Scripts/mp.py daemon --mp-every 30 --asana-every 10
+#   python Scripts/mp.py daemon --mp-every 60 --asana-every 0 -m both -s whatif
+import argparse
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+import config
+import exports
+import get_allMPdata
+import get_AsanaTime
+import run_metrics
+
+DEFAULT_MP_MINUTES = 60
+DEFAULT_ASANA_MINUTES = 15
+
+def log(message: str):
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
+
+class Job:
+    def __init__(self, name: str, interval_minutes: float, run):
+        """
+        One scheduled sync.
+
+        Args:
+            name (str): Script name, used for logs and metrics.
+            interval_minutes (float): Minutes between run starts.
+            run: Callable taking the previous data hash and returning the new one.
+        """
+        self.name = name
+        self.interval_s = interval_minutes * 60
+        self.run = run
+        self.next_run = time.monotonic()
+        self.last_hash = None
+        self.runs = 0
+        self.failures = 0
+
+class Daemon:
+    def __init__(self, jobs: list, metrics_path: str = run_metrics.DEFAULT_METRICS_PATH, prometheus_dir: str = None):
+        """
+        Schedules the jobs in a single loop, so only one run is active at a time.
+
+        Args:
+            jobs (list): Job instances.
+            metrics_path (str): JSON lines file per-stage run metrics are appended to, None to skip.
+            prometheus_dir (str): Directory for one Prometheus textfile per job, None to skip.
+        """
+        self.jobs = jobs
+        self.metrics_path = metrics_path
+        self.prometheus_dir = prometheus_dir
+        self.stopping = threading.Event()
+
+    def stop(self, *args):
+        # Lets the current run finish, then leaves the loop
+        if not self.stopping.is_set():
+            log("Stopping after the current run...")
+        self.stopping.set()
+
+    def run_job(self, job: Job):
+        prometheus_path = os.path.join(self.prometheus_dir, f"{job.name}.prom") if self.prometheus_dir else None
+        run_metrics.start_run(job.name, self.metrics_path, prometheus_path)
+        status = "error"
+        start = time.perf_counter()
+        log(f"--- {job.name}: run {job.runs + 1} ---")
+        try:
+            job.last_hash = job.run(job.last_hash)
+            status = "ok"
+        except Exception as e:
+            # A failed run is retried at the next slot; the daemon keeps going
+            job.failures += 1
+            job.last_hash = None
+            log(f"{job.name} failed: {e}")
+        finally:
+            job.runs += 1
+            run_metrics.finish_run(status)
+        log(f"{job.name} finished in {time.perf_counter() - start:.1f}s ({status})")
+
+    def serve(self):
+        log("Daemon started: " + ", ".join(f"{job.name} every {job.interval_s / 60:g} min" for job in self.jobs))
+        while not self.stopping.is_set():
+            job = min(self.jobs, key=lambda j: j.next_run)
+            delay = job.next_run - time.monotonic()
+            if delay > 0:
+                self.stopping.wait(delay)
+                continue
+            self.run_job(job)
+            # Keep the cadence; a run that overran its slot is followed by one more run, not a backlog
+            job.next_run = max(job.next_run + job.interval_s, time.monotonic())
+        log("Daemon stopped.")
+
+def cli(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Run the Meisterplan export and the Asana sync on schedules in one long-lived process.")
+    parser.add_argument("--mp-every", type=float, default=DEFAULT_MP_MINUTES, help=f"Minutes between Meisterplan exports, 0 to disable (default: {DEFAULT_MP_MINUTES}).")
+    parser.add_argument("--asana-every", type=float, default=DEFAULT_ASANA_MINUTES, help=f"Minutes between Asana syncs, 0 to disable (default: {DEFAULT_ASANA_MINUTES}).")
+    parser.add_argument("-m", "--output-mode", choices=["gsheets", "excel", "both", "parquet", "csv"], default="gsheets", help="Meisterplan export destination (default: gsheets).")
+    scenario_group = parser.add_mutually_exclusive_group()
+    scenario_group.add_argument("-s", "--scenario-id", action="append", help="Alias (from .env) or direct ID of a Meisterplan scenario to export; repeatable. Default: Plan of Record.")
+    scenario_group.add_argument("--all-scenarios", action="store_true", help="Export the Plan of Record and every scenario, re-listed on each run.")
+    parser.add_argument("-w", "--workers", type=int, default=get_allMPdata.DEFAULT_WORKERS, help=f"Meisterplan requests in flight at once (default: {get_allMPdata.DEFAULT_WORKERS}).")
+    parser.add_argument("-i", "--incremental", action="store_true", help="Use the local response cache for the Meisterplan export.")
+    parser.add_argument("--cache-path", default=get_allMPdata.DEFAULT_CACHE_PATH, help="SQLite file for the --incremental response cache.")
+    parser.add_argument("--compact-types", action="store_true", help="Store Meisterplan tabs with compact dtypes (see mp_schema.py).")
+    parser.add_argument("--no-snapshot", action="store_true", help="Don't append changed exports to the local snapshot history.")
+    parser.add_argument("--snapshot-path", default=get_allMPdata.DEFAULT_STORE_PATH, help="SQLite file for the snapshot history (default: Data/snapshots.sqlite).")
+    parser.add_argument("--no-utilisation", action="store_true", help="Don't add the precomputed utilisation tabs to the Meisterplan export.")
+    parser.add_argument("--asana-scenario", help="Alias or ID of the Meisterplan scenario the Asana sync compares against (default: Plan of Record).")
+    parser.add_argument("--asana-workers", type=int, default=get_AsanaTime.DEFAULT_WORKERS, help=f"Concurrent Asana milestone requests (default: {get_AsanaTime.DEFAULT_WORKERS}).")
+    parser.add_argument("--no-reconcile", action="store_true", help="Skip the Asana/MP reconciliation tab.")
+    parser.add_argument("--exports-config", help="TOML file with the endpoints, date windows, columns and spreadsheets of both syncs (default: Scripts/exports.toml).")
+    parser.add_argument("--metrics-path", default=run_metrics.DEFAULT_METRICS_PATH, help="JSON lines file per-stage run metrics are appended to (default: Logs/metrics.jsonl).")
+    parser.add_argument("--no-metrics", action="store_true", help="Don't write per-stage run metrics.")
+    parser.add_argument("--prometheus-dir", help="Write each sync's run metrics to <dir>/<script>.prom for the node_exporter textfile collector.")
+    args = parser.parse_args(argv)
+
+    if args.mp_every <= 0 and args.asana_every <= 0:
+        parser.error("both syncs are disabled")
+
+    try:
+        # Check the settings once up front instead of failing on every run
+        if args.mp_every > 0:
+            config.require("MP_URL", "MP_TOKEN")
+        if args.asana_every > 0:
+            config.require("Asana_TOKEN", "ASANA_URL", "Asana_WorkID", "Asana_PortID", "MP_TOKEN", "MP_URL")
+        exports.load(args.exports_config)
+    except config.ConfigError as e:
+        print(e)
+        exit(1)
+
+    # One authenticated client for every run; google-auth refreshes the token as it expires
+    gc = None
+    if args.asana_every > 0 or (args.mp_every > 0 and args.output_mode in ("gsheets", "both")):
+        gc = get_allMPdata.authenticate_gsheets()
+        if not gc:
+            print("Google sheets authentication failed!")
+            exit(1)
+
+    asana_scenario_id = config.resolve_scenario(args.asana_scenario) if args.asana_scenario else None
+
+    def run_export(last_hash):
+        return get_allMPdata.main(
+            output_mode=args.output_mode,
+            scenarios=get_allMPdata.resolve_scenarios(args.scenario_id, args.all_scenarios),
+            max_workers=args.workers,
+            cache_path=args.cache_path if args.incremental else None,
+            compact_types=args.compact_types,
+            snapshot_path=None if args.no_snapshot else args.snapshot_path,
+            utilisation=not args.no_utilisation,
+            exports_path=args.exports_config,
+            gc=gc,
+            last_hash=last_hash
+        )
+
+    def run_asana(last_hash):
+        return get_AsanaTime.main(
+            scenario_id=asana_scenario_id,
+            max_workers=args.asana_workers,
+            reconcile_data=not args.no_reconcile,
+            exports_path=args.exports_config,
+            gc=gc,
+            last_hash=last_hash
+        )
+
+    jobs = []
+    if args.mp_every > 0:
+        jobs.append(Job("get_allMPdata", args.mp_every, run_export))
+    if args.asana_every > 0:
+        jobs.append(Job("get_AsanaTime", args.asana_every, run_asana))
+
+    daemon = Daemon(jobs, None if args.no_metrics else args.metrics_path, args.prometheus_dir)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    try:
+        daemon.serve()
+    except KeyboardInterrupt:
+        log("Interrupted.")
+
+if __name__ == "__main__":
+    cli()
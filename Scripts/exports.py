@@ -0,0 +1,193 @@
+# exports.py
+# Registry of what the Meisterplan export and the Asana sync fetch and where
+# they write, read from exports.toml instead of being hard-coded in the scripts.
+# Each endpoint has its query params, an optional date window (absolute dates
+# or relative to the run date), the columns to keep and, for the export, the
+# tab it is written to. The file is read at the start of every run, so the
+# daemon picks up edits and relative windows move with the calendar.
+#
+# Window ends are dates (2024-01-01) or relative to the run date:
+#   "today", "+90d"/"-30d" (days), "+24m"/"-6m" (months), "+5y"/"-1y" (years).
+# Month and year offsets cover whole periods: a start snaps to the first day of
+# its month/year and a finish to the last, so the URL (and with it the response
+# cache and the page checkpoints) only changes when a new month begins.
+import os
+import re
+from datetime import date, timedelta
+from urllib.parse import urlencode
+import config
+
+try:
+    import tomllib
+except ImportError:
+    # Python < 3.11
+    import tomli as tomllib
+
+DEFAULT_EXPORTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exports.toml")
+
+# Endpoints the Asana sync reads from Meisterplan
+ASANA_ENDPOINTS = ("Projects", "Milestones")
+
+ENDPOINT_KEYS = {"endpoint", "params", "window", "columns", "shared", "shard"}
+RELATIVE_DATE = re.compile(r"^([+-]\d+)([dmy])$")
+
+def _month_start(months: int) -> date:
+    # Months since year 0 -> first day of that month
+    return date(months // 12, months % 12 + 1, 1)
+
+def resolve_date(value, end: bool = False, today: date = None) -> date:
+    """
+    Turns a window end from the config into a date.
+
+    Args:
+        value: A date, an ISO date string, "today" or a relative offset such as "-6m".
+        end (bool): True for the finish of a window; month and year offsets then
+            snap to the last day of the period instead of the first.
+        today (date): Run date the relative offsets count from (default: today).
+
+    Returns:
+        date: The resolved date.
+
+    Raises:
+        ValueError: If the value is not a valid date or offset.
+    """
+    today = today or date.today()
+    if isinstance(value, date):
+        return value
+    value = str(value).strip()
+    if value == "today":
+        return today
+    match = RELATIVE_DATE.match(value)
+    if not match:
+        return date.fromisoformat(value)
+
+    amount, unit = int(match.group(1)), match.group(2)
+    if unit == "d":
+        return today + timedelta(days=amount)
+    if unit == "m":
+        month = today.year * 12 + today.month - 1 + amount
+        return _month_start(month + 1) - timedelta(days=1) if end else _month_start(month)
+    year = today.year + amount
+    return date(year, 12, 31) if end else date(year, 1, 1)
+
+class Endpoint:
+    def __init__(self, name: str, settings: dict, today: date = None):
+        """
+        One endpoint of the registry, with its date window resolved for this run.
+
+        Args:
+            name (str): Tab name (export) or endpoint name (Asana sync).
+            settings (dict): The endpoint's table from exports.toml.
+            today (date): Run date the relative windows count from.
+
+        Raises:
+            config.ConfigError: If the table has unknown keys or invalid values.
+        """
+        unknown = set(settings) - ENDPOINT_KEYS
+        if unknown:
+            raise config.ConfigError(f"Unknown setting(s) {', '.join(sorted(unknown))} for endpoint '{name}' in exports config")
+        if not settings.get("endpoint"):
+            raise config.ConfigError(f"Endpoint '{name}' has no 'endpoint' path in exports config")
+
+        self.name = name
+        self.path = settings["endpoint"].strip("/")
+        self.columns = list(settings.get("columns") or [])
+        self.shared = bool(settings.get("shared", False))
+        self.shard = bool(settings.get("shard", False))
+
+        self.window = None
+        if "window" in settings:
+            window = settings["window"]
+            try:
+                if len(window) != 2:
+                    raise ValueError("expected [start, finish]")
+                start, finish = resolve_date(window[0], False, today), resolve_date(window[1], True, today)
+            except (TypeError, ValueError) as e:
+                raise config.ConfigError(f"Invalid window {window!r} for endpoint '{name}' in exports config: {e}")
+            if start > finish:
+                raise config.ConfigError(f"Window of endpoint '{name}' starts after it finishes ({start} > {finish})")
+            self.window = (start, finish)
+
+        # Date window first, so the URLs match the ones earlier runs cached and checkpointed
+        params = {}
+        if self.window:
+            params = {"startDate": self.window[0].isoformat(), "finishDate": self.window[1].isoformat()}
+        params.update({key: str(value) for key, value in (settings.get("params") or {}).items()})
+        self.endpoint = f"{self.path}?{urlencode(params)}" if params else self.path
+
+    def project(self, df):
+        """
+        Keeps only the configured columns, in the configured order. A column
+        also keeps the fields flattened out of it ("customFields" keeps
+        "customFields.status").
+
+        Args:
+            df (pd.DataFrame): The fetched (and flattened) items.
+
+        Returns:
+            pd.DataFrame: The projected frame; unchanged when no columns are configured.
+        """
+        if not self.columns or df.empty:
+            return df
+        keep = []
+        for column in self.columns:
+            matches = [c for c in df.columns if c == column or c.startswith(f"{column}.")]
+            if not matches:
+                print(f"Warning: column '{column}' not found in {self.name.lower()}")
+            keep += [c for c in matches if c not in keep]
+        return df[keep]
+
+class Registry:
+    def __init__(self, settings: dict, today: date = None):
+        """
+        The export tabs, the Asana sync endpoints and their spreadsheets.
+
+        Args:
+            settings (dict): The parsed exports.toml.
+            today (date): Run date the relative windows count from.
+
+        Raises:
+            config.ConfigError: If a section is missing or invalid.
+        """
+        export = settings.get("export") or {}
+        asana = settings.get("asana") or {}
+        try:
+            self.por_spreadsheet = export["por_spreadsheet"]
+            self.scenario_spreadsheet = export["scenario_spreadsheet"]
+            self.asana_spreadsheet = asana["spreadsheet"]
+        except KeyError as e:
+            raise config.ConfigError(f"Missing {e} in exports config")
+
+        # Tables keep their file order, which is the tab order of the export
+        self.tabs = {name: Endpoint(name, tab, today) for name, tab in (export.get("tabs") or {}).items()}
+        if not self.tabs:
+            raise config.ConfigError("No [export.tabs] in exports config")
+
+        self.asana_endpoints = {name: Endpoint(name, endpoint, today) for name, endpoint in (asana.get("endpoints") or {}).items()}
+        missing = [name for name in ASANA_ENDPOINTS if name not in self.asana_endpoints]
+        if missing:
+            raise config.ConfigError(f"Missing [asana.endpoints.{'], ['.join(missing)}] in exports config")
+
+def load(path: str = None, today: date = None) -> Registry:
+    """
+    Reads the exports config.
+
+    Args:
+        path (str): TOML file (default: DEFAULT_EXPORTS_PATH, or the MP_EXPORTS_CONFIG setting).
+        today (date): Run date the relative windows count from (default: today).
+
+    Returns:
+        Registry: The endpoints with their windows resolved.
+
+    Raises:
+        config.ConfigError: If the file is missing or invalid.
+    """
+    path = path or config.get("MP_EXPORTS_CONFIG") or DEFAULT_EXPORTS_PATH
+    try:
+        with open(path, "rb") as f:
+            settings = tomllib.load(f)
+    except FileNotFoundError:
+        raise config.ConfigError(f"Exports config not found: {path}")
+    except tomllib.TOMLDecodeError as e:
+        raise config.ConfigError(f"Invalid exports config {path}: {e}")
+    return Registry(settings, today)
@@ -1,44 +1,24 @@
-import requests
-import json
 import os
-import gspread
+import hashlib
+import json
+import api_client
+import config
+import exports
+import run_metrics
+from sheets_writer import text_values, write_tab_diff
 import argparse
-from datetime import datetime
-from dotenv import load_dotenv
-
-# Load API token and variables from .env file
-load_dotenv()
-ASANA_TOKEN = os.getenv("Asana_TOKEN")
-ASANA_URL = os.getenv("ASANA_URL")
-ASANA_WORK_ID = os.getenv("Asana_WorkID")
-ASANA_PORT_ID = os.getenv("Asana_PortID")
-MP_TOKEN = os.getenv("MP_TOKEN")
-MP_URL = os.getenv("MP_URL")
-
-# validate environment variables
-if not ASANA_TOKEN or not ASANA_URL or not ASANA_WORK_ID or not ASANA_PORT_ID:
-    print("Missing Asana details in .env")
-    exit()
-
-scenarios_from_env = {}
-for key, value in os.environ.items():
-    if key.startswith("MP_SCENARIO_"):
-        friendly_name = key.replace("MP_SCENARIO_", "").lower()
-        scenarios_from_env[friendly_name] = value
-if scenarios_from_env:
-    print(f"Loaded {len(scenarios_from_env)} scenario aliases from .env file:")
-    # for alias in scenarios_from_env:
-    #     print(f"  - {alias}")
-
-# Set up headers for API requests
-asana_headers = {
-    "Authorization": f"Bearer {ASANA_TOKEN}",
-    "Accept": "application/json"
-}
-mp_headers = {
-    "Authorization": f"Bearer {MP_TOKEN}",
-    "Accept": "application/json"
-}
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+
+# Records per Asana page (API maximum is 100)
+ASANA_PAGE_LIMIT = 100
+
+# Concurrent milestone requests; Asana allows up to 50 concurrent GETs per token
+DEFAULT_WORKERS = 10
+
+# Tab for the precomputed Asana <-> MP mismatches (see reconcile.py)
+MISMATCH_SHEET = "Mismatches"
 
 CUSTOM_FIELDS_LIST = [
     "MP Mapping", 
@@ -47,58 +27,71 @@ CUSTOM_FIELDS_LIST = [
 ]
 
 # ASANA PROJECT PULLING FUNCTIONS - get_proj, get_milestones, get_cust fields, ready_for_sheet
-def get_proj_in_port(portfolio_gid):
-    # Fetch projects in a specific portfolio
-    # Returns list of project dictionaries, empty if none found
-    items_url = f"{ASANA_URL}/portfolios/{portfolio_gid}/items"
+def iter_proj_in_port(portfolio_gid, limit=ASANA_PAGE_LIMIT):
+    # Yields the projects in a specific portfolio, following every page
+    items_url = f"{config.asana_url()}/portfolios/{portfolio_gid}/items"
     params = {"opt_fields": "name, permalink_url, custom_fields"}
 
     print(f"Fetching projects in portfolio {portfolio_gid}...")
-    try:
-        response = requests.get(items_url, headers=asana_headers, params=params)
-        response.raise_for_status()  # Raise an error for bad responses
-        projects = response.json().get("data", [])
-        print(f"Found {len(projects)} projects in portfolio {portfolio_gid}.")
-        return projects
-    
-    except requests.RequestException as e:
-        print(f"Error fetching projects: {e}")
-        if e.response:
-            print(f"Response: {e.response.text}")
-        return []
+    for page in api_client.iter_asana_pages(items_url, config.asana_headers(), params, limit):
+        yield from page
 
-def get_asana_milestones(workspace_gid, project_gid, project_name):
-    # Fetches all milestones for a specific project from the Asana API.
-    
-    search_url = f"{ASANA_URL}/workspaces/{workspace_gid}/tasks/search"
+def get_proj_in_port(portfolio_gid):
+    # Fetch projects in a specific portfolio
+    # Returns list of project dictionaries, empty if none found
+    projects = list(iter_proj_in_port(portfolio_gid))
+    print(f"Found {len(projects)} projects in portfolio {portfolio_gid}.")
+    return projects
+
+def iter_asana_milestones(workspace_gid, project_gid, limit=ASANA_PAGE_LIMIT):
+    # Yields all milestones for a specific project from the Asana API.
+    # The search endpoint has no next_page offset, so pages are walked by
+    # created_at as Asana recommends: sort ascending and ask for records after the last one seen.
+    search_url = f"{config.asana_url()}/workspaces/{workspace_gid}/tasks/search"
+    headers = config.asana_headers()
     params = {
         "projects.any": project_gid,
         "resource_subtype": "milestone",
-        "opt_fields": "name,due_on,completed,permalink_url",
-    }    
+        "opt_fields": "name,due_on,completed,permalink_url,created_at",
+        "sort_by": "created_at",
+        "sort_ascending": "true",
+        "limit": limit,
+    }
+
+    # Errors propagate so a failed project can't silently drop its milestones
+    seen = set()
+    while True:
+        page = api_client.get_json(search_url, headers=headers, params=params).get("data", [])
+        new_milestones = [m for m in page if m["gid"] not in seen]
+        yield from new_milestones
+
+        if len(page) < limit or not new_milestones:
+            break
+        seen.update(m["gid"] for m in new_milestones)
+        params = {**params, "created_at.after": page[-1]["created_at"]}
+
+def get_asana_milestones(workspace_gid, project_gid, project_name):
+    # Fetches all milestones for a specific project from the Asana API.
     # print(f"\n- Querying for milestones in project: '{project_name}'...")
-    
-    try:
-        response = requests.get(search_url, headers=asana_headers, params=params)
-        response.raise_for_status()
-        milestones = response.json().get("data", [])
-        # print(f"  Found {len(milestones)} milestones.")
-        return milestones
-    except requests.exceptions.RequestException as e:
-        print(f"  An error occurred while fetching milestones for project {project_gid}: {e}")
-        return []
-    except json.JSONDecodeError:
-        print(f"  Failed to decode the JSON response for project {project_gid}.")
-        return []
-
-def get_cust_fields(project, field_name):
-    # Extracts Meisterplan key from project custom fields.
+    milestones = list(iter_asana_milestones(workspace_gid, project_gid))
+    # print(f"  Found {len(milestones)} milestones.")
+    return milestones
+
+def flatten_cust_fields(project, field_names):
+    # Extracts the requested custom field values (e.g. the Meisterplan key) in one pass.
+    # Enum fields give their option name, others their display value; the first field with a name wins.
+    pending = set(field_names)
+    values = dict.fromkeys(field_names)
     for field in project.get('custom_fields', []):
-        if field and field.get('name') == field_name:
-            if field.get('enum_value'):
-                return field.get('enum_value').get('name')
-            return field.get('display_value')
-    return None
+        if field and field.get('name') in pending:
+            name = field['name']
+            pending.discard(name)
+            enum_value = field.get('enum_value')
+            values[name] = enum_value.get('name') if enum_value else field.get('display_value')
+            # Stop as soon as every requested field was found
+            if not pending:
+                break
+    return values
 
 def ready_asana_data_for_sheet(all_data, custom_field_names):
     header = ["Project Name", "Asana Project ID"]
@@ -136,44 +129,53 @@ def ready_asana_data_for_sheet(all_data, custom_field_names):
     
     return rows_for_sheet
 
+def build_project_info(project):
+    # Collects custom fields and milestones for one Asana project
+    project_gid = project['gid']
+    project_name = project['name']
+    custom_fields_data = flatten_cust_fields(project, CUSTOM_FIELDS_LIST)
+
+    project_info = {
+        "project_gid": project_gid,
+        "project_name": project_name,
+        "custom_fields": custom_fields_data,
+        "milestones": []
+    }
+
+    workspace_id = config.asana_ids()[0]
+    milestones = get_asana_milestones(workspace_id, project_gid, project_name)
+    if milestones:
+        project_info["milestones"] = milestones
+
+    return project_info
+
+def fetch_portfolio_data(projects, max_workers=DEFAULT_WORKERS):
+    """
+    Fetches milestones for every project through a bounded thread pool.
+    Asana rate limits (429 / Retry-After) are retried by the shared api_client session.
+    Only a small window of projects is in flight at once, so results stream out
+    as the portfolio pages are read.
+
+    Args:
+        projects: Iterable of projects, e.g. from iter_proj_in_port.
+        max_workers (int): Maximum number of concurrent milestone requests.
+
+    Yields:
+        dict: project_info dictionaries in the same order as projects.
+    """
+    max_workers = max(1, max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for project in projects:
+            pending.append(executor.submit(run_metrics.wrap(build_project_info), project))
+            if len(pending) >= max_workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
 # MEISTERPLAN PULLING FUNCTIONS - fetch_paginated, ready_for_sheet
 def fetch_paginated(endpoint, scenario_id=None):
-    all_items = []
-    url = f"{MP_URL}/{endpoint}"
-    if scenario_id:
-        if '?' in url:
-            url += f"&scenario={scenario_id}"
-        else:
-            url += f"?scenario={scenario_id}"
-    
-    page_count = 1
-    while url:
-        # *** DEBUGGING: Print the URL we are about to call ***
-        # print(f"DEBUG: Calling page {page_count}: {url}")
-
-        response = requests.get(url, headers=mp_headers)
-        if response.status_code != 200:
-            print(f"Failed to fetch data from {endpoint}: {response.status_code}")
-            print(response.text)
-            break
-        data = response.json()
-        items = data if isinstance(data, list) else data.get("items", [])
-        all_items.extend(items)
-        
-        url = data.get("meta", {}).get("next") if isinstance(data, dict) else None
-        
-        # *** DEBUGGING: Print the 'next' link we received from the API ***
-        # if url:
-        #     print(f"DEBUG: API returned next link: {url}")
-        # else:
-        #     print("DEBUG: No more pages.")
-
-        if url and not url.startswith("http"):
-            url = MP_URL + url
-        
-        page_count += 1
-            
-    return all_items
+    return api_client.fetch_paginated(config.mp_url(), endpoint, config.mp_headers(), scenario_id)
 
 def ready_mp_data_for_sheet(mp_projects, mp_milestones):
     header = ["projectName", "projectKey", "projectStart", "projectFinish", "projectId", "scenarioProjectId", "cust_asana_id", "milestoneName", "milestoneDate", "projectPhaseName"]
@@ -221,6 +223,7 @@ def ready_mp_data_for_sheet(mp_projects, mp_milestones):
 # Google sheets authetication & writing functions
 def authenticate_gsheets():
     # Authenticates with Google Sheets API using credentials
+    import gspread
     BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
     CRED_DIR = os.path.join(BASE_DIR, "credentials")
     
@@ -237,7 +240,7 @@ def authenticate_gsheets():
         print(f"Authentication failed: {e}")
         return None
     
-def write_to_gsheets(gc, spreadsheet_name: str, sheet_name: str, rows_to_write: list):
+def write_to_gsheets(gc, spreadsheet_name: str, sheet_name: str, rows_to_write: list, create: bool = False):
     """
     Writes multiple DataFrames to tabs in a Google Sheet, replacing existing data.
     
@@ -245,24 +248,39 @@ def write_to_gsheets(gc, spreadsheet_name: str, sheet_name: str, rows_to_write:
         gc: Authenticated gspread client.
         spreadsheet_name (str): Name of the Google Sheet.
         dataframes (dict): Dictionary where keys are tab names and values are DataFrames.
+        create (bool): Add the tab if it does not exist yet instead of failing.
+
+    Raises:
+        Exception: If the spreadsheet or tab is missing or a write fails, so the
+            caller doesn't record the data as written.
     """
+    import gspread
     try:
         # Open the spreadsheet (must exist beforehand and be shared with service account)
         sh = gc.open(spreadsheet_name)
     except gspread.SpreadsheetNotFound:
         print(f"Spreadsheet '{spreadsheet_name}' not found.")
-        return
+        raise
 
     # Writing main data to spreadsheet
     try:
-        worksheet = sh.worksheet(sheet_name)
-        worksheet.clear()
-        worksheet.update(rows_to_write)
+        try:
+            worksheet = sh.worksheet(sheet_name)
+        except gspread.WorksheetNotFound:
+            if not create:
+                raise
+            worksheet = sh.add_worksheet(title=sheet_name, rows=max(len(rows_to_write), 1), cols=max(len(rows_to_write[0]), 1))
+        # Send only the rows that changed since the last write
+        with run_metrics.stage("gsheets", spreadsheet=spreadsheet_name, tab=sheet_name) as stage:
+            write_tab_diff(worksheet, text_values(rows_to_write))
+            stage.rows = len(rows_to_write) - 1
 
     except gspread.WorksheetNotFound:
         print(f"❌ ERROR: Worksheet '{sheet_name}' not found. Please create it first.")
+        raise
     except Exception as e:
-        print(f"An unexpected error occurred during writing: {e}")       
+        print(f"An unexpected error occurred during writing: {e}")
+        raise
 
     # Writing Timestamp data to spreadsheet 
     try:
@@ -274,94 +292,132 @@ def write_to_gsheets(gc, spreadsheet_name: str, sheet_name: str, rows_to_write:
         except gspread.WorksheetNotFound:
             ts_sheet = sh.add_worksheet(title=timestamp_sheet_name, rows="10", cols="2")
         ts_sheet.update([["Last Updated"], [timestamp_value]])
-    except gspread.WorksheetNotFound:
-        print(f"❌ ERROR: Worksheet '{sheet_name}' not found. Please create it first.")
     except Exception as e:
         print(f"An unexpected error occurred during writing: {e}")
+        raise
    
     print(f"Data written to Google Sheet '{spreadsheet_name}'")  
 
+def rows_hash(*tables) -> str:
+    # Content hash of sheet rows, used to skip writes when nothing changed
+    return hashlib.blake2b(json.dumps(tables, default=str).encode(), digest_size=16).hexdigest()
+
 # Main script definition
-def main(scenario_id=None):
-    gc = authenticate_gsheets()
+def main(scenario_id=None, max_workers=DEFAULT_WORKERS, reconcile_data=True, gc=None, last_hash=None, exports_path=None):
+    """
+    Fetches Asana and Meisterplan, writes both tabs and the mismatches.
+
+    Args:
+        scenario_id (str): Meisterplan scenario ID, None for the Plan of Record.
+        max_workers (int): Concurrent Asana milestone requests.
+        reconcile_data (bool): Also write the MISMATCH_SHEET tab.
+        gc: Authenticated gspread client to reuse; authenticates when None.
+        last_hash (str): rows_hash of the previous run; nothing is written when the data still matches it.
+        exports_path (str): Exports config with the Meisterplan endpoints and the spreadsheet (default: Scripts/exports.toml).
+
+    Returns:
+        str: rows_hash of the data written, None when the run could not complete.
+
+    Raises:
+        Exception: If a Google Sheets write fails; the hash is only returned once every tab was written.
+    """
+    # Fail before authenticating if any setting is missing
+    config.require("Asana_TOKEN", "ASANA_URL", "Asana_WorkID", "Asana_PortID", "MP_TOKEN", "MP_URL")
+    portfolio_id = config.asana_ids()[1]
+    registry = exports.load(exports_path)
+    endpoints, spreadsheet = registry.asana_endpoints, registry.asana_spreadsheet
+
+    gc = gc or authenticate_gsheets()
     if not gc:
         print("Google sheets authentication failed!")
-        return
+        return None
+
+    # Asana Data fetch
+    print("--- Starting Asana Data fetch ---")        
+    projects = iter_proj_in_port(portfolio_id)
+
+    # Projects stream page by page into the milestone fetch and on into the sheet rows
+    api_client.set_max_in_flight(max_workers)
+    with run_metrics.stage("asana_fetch", portfolio=portfolio_id) as stage:
+        project_infos = fetch_portfolio_data(projects, max_workers)
+        spreadsheet_rows = ready_asana_data_for_sheet(project_infos, CUSTOM_FIELDS_LIST)
+        stage.rows = len(spreadsheet_rows) - 1
+
+    project_count = len({row[1] for row in spreadsheet_rows[1:]})
+    if project_count:
+        print(f"✅ Successfully pulled data from {project_count} projects.")
+    else:
+        print("\nNo Asana projects found. Please check your Portfolio ID and API permissions.")
     
-    if not all([ASANA_TOKEN, ASANA_URL, ASANA_WORK_ID, ASANA_PORT_ID, MP_TOKEN, MP_URL]):
-        print("Missing required environment variables.")
+    # Meisterplan Data fetch
+    print("\n--- Starting Meisterplan Data Fetch ---")
+    if scenario_id:
+        print(f"Fetching data from Scenario ID: {scenario_id}")
     else:
-        # Asana Data fetch & write
-        print("--- Starting Asana Data fetch ---")        
-        projects = get_proj_in_port(ASANA_PORT_ID)
-        
-        if projects:
-            all_data = []
-            for project in projects:
-                project_gid = project['gid']
-                project_name = project['name']
-                custom_fields_data = {}
-
-                for field_name in CUSTOM_FIELDS_LIST:
-                    field_value = get_cust_fields(project, field_name)
-                    custom_fields_data[field_name] = field_value
-
-                project_info = {
-                    "project_gid": project_gid,
-                    "project_name": project_name,
-                    "custom_fields": custom_fields_data,
-                    "milestones": []
-                }
-
-                milestones = get_asana_milestones(ASANA_WORK_ID, project_gid, project_name)
-                if milestones:
-                    project_info["milestones"] = milestones
-
-                all_data.append(project_info)
-
-            # Print the aggregated results
-            if all_data:
-                project_count = len(all_data)
-                total_milestones = sum(len(p.get('milestones', [])) for p in all_data)
-                print(f"✅ Successfully pulled data from {project_count} projects.")
-                
-                spreadsheet_rows = ready_asana_data_for_sheet(all_data, CUSTOM_FIELDS_LIST)
-                write_to_gsheets(gc, "Asana - MP Mapping", "Asana Data", spreadsheet_rows)
-  
-            else:
-                print("\nNo Asana data found for any projects within the portfolio.")            
-        else:
-            print("\nCould not fetch Asana projects. Please check your Portfolio ID and API permissions.")
-        
-        # Meisterplan Data fetch & write
-        print("\n--- Starting Meisterplan Data Fetch ---")
-        if scenario_id:
-            print(f"Fetching data from Scenario ID: {scenario_id}")
-        else:
-            print(f"Fetching data from Plan of Record")
-        
-        mp_projects = fetch_paginated("projects?startDate=2024-01-01&finishDate=2030-12-31", scenario_id)
-        mp_milestones = fetch_paginated("milestones?startDate=2024-01-01&finishDate=2030-12-31", scenario_id)
-        if mp_projects and mp_milestones:
+        print(f"Fetching data from Plan of Record")
+    
+    with run_metrics.stage("fetch", tab="Projects", scenario=scenario_id or "PoR") as stage:
+        mp_projects = fetch_paginated(endpoints["Projects"].endpoint, scenario_id)
+        stage.rows = len(mp_projects)
+    with run_metrics.stage("fetch", tab="Milestones", scenario=scenario_id or "PoR") as stage:
+        mp_milestones = fetch_paginated(endpoints["Milestones"].endpoint, scenario_id)
+        stage.rows = len(mp_milestones)
+    mp_data = None
+    if mp_projects and mp_milestones:
+        with run_metrics.stage("build", tab="MP Data") as stage:
             mp_data = ready_mp_data_for_sheet(mp_projects, mp_milestones)
-            write_to_gsheets(gc, "Asana - MP Mapping", "MP Data", mp_data)
-        else:
-            print("\nCould not fetch Meisterplan projects. Please check your Portfolio ID and API permissions.")
+            stage.rows = len(mp_data) - 1
+
+    # Mismatch statuses depend on the date, so a new day always counts as a change
+    data_hash = rows_hash(spreadsheet_rows, mp_data, reconcile_data and date.today().isoformat())
+    if data_hash == last_hash:
+        print("\nData unchanged since the last run, skipping writes.")
+        return data_hash
+
+    if project_count:
+        write_to_gsheets(gc, spreadsheet, "Asana Data", spreadsheet_rows)
+    if mp_data is None:
+        print("\nCould not fetch Meisterplan projects. Please check your Portfolio ID and API permissions.")
+        return None
+    write_to_gsheets(gc, spreadsheet, "MP Data", mp_data)
+
+    # Match Asana and MP here instead of with sheet formulas
+    if reconcile_data and project_count:
+        print("\n--- Reconciling Asana and Meisterplan ---")
+        # Imported here: reconcile needs pandas, which --no-reconcile runs never load
+        from reconcile import reconcile
+        with run_metrics.stage("reconcile") as stage:
+            mismatches = reconcile(spreadsheet_rows, mp_data)
+            stage.rows = len(mismatches) - 1
+        print(f"Found {len(mismatches) - 1} mismatches.")
+        write_to_gsheets(gc, spreadsheet, MISMATCH_SHEET, mismatches, create=True)
+
+    return data_hash
 
 # Main script execution
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Fetch data from Meisterplan and Asana.")
+def cli(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Fetch data from Meisterplan and Asana.")
     parser.add_argument("-s", "--scenario-id", help="Alias (from .env) or direct ID of the Meisterplan scenario.")
-    args = parser.parse_args()
-
-    scenario_input = args.scenario_id
-    final_scenario_id = None
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help=f"Concurrent Asana milestone requests (default: {DEFAULT_WORKERS}).")
+    parser.add_argument("--metrics-path", default=run_metrics.DEFAULT_METRICS_PATH, help="JSON lines file per-stage run metrics are appended to (default: Logs/metrics.jsonl).")
+    parser.add_argument("--no-metrics", action="store_true", help="Don't write per-stage run metrics.")
+    parser.add_argument("--prometheus-file", help="Also write the run metrics to this Prometheus textfile.")
+    parser.add_argument("--no-reconcile", action="store_true", help=f"Skip the Asana/MP reconciliation and the '{MISMATCH_SHEET}' tab.")
+    parser.add_argument("--exports-config", help="TOML file with the Meisterplan endpoints and the spreadsheet to write (default: Scripts/exports.toml).")
+    args = parser.parse_args(argv)
+
+    final_scenario_id = config.resolve_scenario(args.scenario_id) if args.scenario_id else None
+
+    run_metrics.start_run("get_AsanaTime", None if args.no_metrics else args.metrics_path, args.prometheus_file)
+    status = "error"
+    try:
+        main(scenario_id=final_scenario_id, max_workers=args.workers, reconcile_data=not args.no_reconcile, exports_path=args.exports_config)
+        status = "ok"
+    except config.ConfigError as e:
+        print(e)
+        exit(1)
+    finally:
+        run_metrics.finish_run(status)
 
-    if scenario_input:
-        if scenario_input in scenarios_from_env:
-            final_scenario_id = scenarios_from_env[scenario_input]
-            print(f"Found alias '{scenario_input}'. Using Scenario ID: {final_scenario_id}")
-        else:
-            final_scenario_id = scenario_input
-    
-    main(scenario_id=final_scenario_id)
\ No newline at end of file
+if __name__ == "__main__":
+    cli()
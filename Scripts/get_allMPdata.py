@@ -1,79 +1,252 @@
 import os
 import requests
 import pandas as pd
-import gspread
 import argparse
-from gspread_dataframe import set_with_dataframe
-from datetime import datetime
-from dotenv import load_dotenv
-
-# load API token and variables from .env file
-load_dotenv()
-MP_TOKEN = os.getenv("MP_TOKEN")
-MP_URL = os.getenv("MP_URL")
-
-# validate environment variables
-if not MP_URL or not MP_TOKEN:
-    print("Missing MP_URL or MP_TOKEN in .env")
-    exit()
-
-scenarios_from_env = {}
-for key, value in os.environ.items():
-    if key.startswith("MP_SCENARIO_"):
-        friendly_name = key.replace("MP_SCENARIO_", "").lower()
-        scenarios_from_env[friendly_name] = value
-if scenarios_from_env:
-    print(f"Loaded {len(scenarios_from_env)} scenario aliases from .env file:")
-    # for alias in scenarios_from_env:
-    #     print(f"  - {alias}")
-
-# build out headers
-headers = {
-    "Authorization": f"Bearer {MP_TOKEN}",
-    "Accept": "application/json"
-}
+import hashlib
+import json
+import re
+import api_client
+import checkpoints
+import config
+import exports
+import get_scenarios
+import run_metrics
+from response_cache import ResponseCache
+from mp_schema import apply_schema, entity_for, flatten_nested
+from snapshot_store import DEFAULT_STORE_PATH, SnapshotStore
+from sheets_writer import DEFAULT_CHUNK_ROWS, write_frame
+from utilisation import utilisation_tabs
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from urllib.parse import parse_qsl, urlencode
+
+DEFAULT_WORKERS = 5
+
+# Date-window sharding: tabs with shard = true in exports.toml have their
+# startDate..finishDate range split into calendar windows that are fetched in
+# parallel and merged back in order
+SHARD_MONTHS = {"month": 1, "quarter": 3, "year": 12}
+SHARD_CHOICES = ["none"] + list(SHARD_MONTHS)
+
+# Google Sheets tabs uploaded at the same time per spreadsheet
+DEFAULT_SHEETS_WORKERS = 4
+
+# Response cache used by --incremental
+DEFAULT_CACHE_PATH = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), "Cache", "responses.sqlite")
 
 # Generic fetcher to support pagination
 def fetch_paginated(endpoint, scenario_id=None):
-    all_items = []
-    url = f"{MP_URL}/{endpoint}"
-    if scenario_id:
-        if '?' in url:
-            url += f"&scenario={scenario_id}"
+    return api_client.fetch_paginated(config.mp_url(), endpoint, config.mp_headers(), scenario_id)
+
+def date_shards(start_date: str, finish_date: str, shard: str) -> list:
+    """
+    Splits an inclusive date range into consecutive calendar-aligned windows.
+
+    Args:
+        start_date (str): First day of the range (YYYY-MM-DD).
+        finish_date (str): Last day of the range (YYYY-MM-DD).
+        shard (str): Window size, one of "month", "quarter" or "year".
+
+    Returns:
+        list: (startDate, finishDate) tuples in chronological order.
+    """
+    step = SHARD_MONTHS[shard]
+    current = date.fromisoformat(start_date)
+    finish = date.fromisoformat(finish_date)
+
+    windows = []
+    while current <= finish:
+        # First day of the next month/quarter/year boundary
+        next_index = ((current.year * 12 + current.month - 1) // step + 1) * step
+        next_start = date(next_index // 12, next_index % 12 + 1, 1)
+        windows.append((current.isoformat(), min(next_start - timedelta(days=1), finish).isoformat()))
+        current = next_start
+    return windows
+
+def shard_endpoint(endpoint: str, shard: str) -> list:
+    """
+    Splits an endpoint with startDate/finishDate parameters into one endpoint per date window.
+    Endpoints without a date range are returned unchanged.
+
+    Args:
+        endpoint (str): Endpoint path with query string.
+        shard (str): One of SHARD_CHOICES.
+
+    Returns:
+        list: Endpoint paths in chronological order.
+    """
+    path, _, query = endpoint.partition("?")
+    params = dict(parse_qsl(query))
+    if shard == "none" or "startDate" not in params or "finishDate" not in params:
+        return [endpoint]
+
+    return [
+        f"{path}?{urlencode({**params, 'startDate': start, 'finishDate': finish})}"
+        for start, finish in date_shards(params["startDate"], params["finishDate"], shard)
+    ]
+
+def slice_key(item: dict) -> bytes:
+    # Content hash of a slice, independent of key order
+    return hashlib.blake2b(json.dumps(item, sort_keys=True).encode(), digest_size=16).digest()
+
+def merge_shards(shards):
+    """
+    Yields the items of each shard in shard order, skipping any slice already
+    returned by an earlier shard (duplicates at window boundaries). Identical
+    slices within one shard are kept, as in an unsharded fetch.
+
+    Args:
+        shards: Iterable of item iterables, one per shard, in chronological order.
+
+    Yields:
+        dict: The items, without the ones repeated from earlier shards.
+    """
+    earlier = set()
+    for items in shards:
+        current = set()
+        for item in items:
+            key = slice_key(item)
+            if key not in earlier:
+                current.add(key)
+                yield item
+        earlier |= current
+
+def read_ndjson(filepath: str):
+    # Yields one item per line of a spill file
+    with open(filepath, encoding="utf-8") as f:
+        for line in f:
+            yield api_client.loads(line)
+
+def read_spill(filepath: str) -> pd.DataFrame:
+    # Decoded with the same JSON decoder and built the same way as the in-memory
+    # path, so floats and dtypes (and with them frames_hash) match it exactly
+    return flatten_nested(pd.DataFrame(list(read_ndjson(filepath))))
+
+def fetch_sharded(name: str, endpoints: list, scenario_id=None, spill_dir: str = None, max_workers: int = DEFAULT_WORKERS) -> pd.DataFrame:
+    """
+    Fetches the date-window shards of one endpoint concurrently and merges them in shard order.
+
+    Args:
+        name (str): Tab name, used for the spill file names.
+        endpoints (list): Sharded endpoint paths in chronological order.
+        scenario_id (str): Optional scenario ID.
+        spill_dir (str): Optional directory to stream shard pages to.
+        max_workers (int): Maximum number of shards fetched at the same time.
+
+    Returns:
+        pd.DataFrame: The merged, de-duplicated items.
+    """
+    print(f"Fetching {name.lower()} in {len(endpoints)} shards...")
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        if not spill_dir:
+            shard_items = list(executor.map(run_metrics.wrap(lambda endpoint: fetch_paginated(endpoint, scenario_id)), endpoints))
+            total = sum(len(items) for items in shard_items)
+            df = flatten_nested(pd.DataFrame(list(merge_shards(shard_items))))
         else:
-            url += f"?scenario={scenario_id}"
-    
-    page_count = 1
-    while url:
-        # *** DEBUGGING: Print the URL we are about to call ***
-        # print(f"DEBUG: Calling page {page_count}: {url}")
-
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            print(f"Failed to fetch data from {endpoint}: {response.status_code}")
-            print(response.text)
-            break
-        data = response.json()
-        items = data.get("items", [])
-        all_items.extend(items)
-        
-        url = data.get("meta", {}).get("next")
-        
-        # *** DEBUGGING: Print the 'next' link we received from the API ***
-        # if url:
-        #     print(f"DEBUG: API returned next link: {url}")
-        # else:
-        #     print("DEBUG: No more pages.")
-
-        if url and not url.startswith("http"):
-            url = MP_URL + url
-        
-        page_count += 1
-            
-    return all_items
+            os.makedirs(spill_dir, exist_ok=True)
+            mp_url, mp_headers = config.mp_url(), config.mp_headers()
+            shard_paths = [os.path.join(spill_dir, f"{name.lower()}_{i:03d}.ndjson") for i in range(len(endpoints))]
+            counts = executor.map(
+                run_metrics.wrap(lambda endpoint, path: api_client.spill_paginated(mp_url, endpoint, mp_headers, path, scenario_id)),
+                endpoints, shard_paths
+            )
+            total = sum(counts)
+
+            # Merge shard files into one spill file without loading them into memory
+            spill_path = os.path.join(spill_dir, f"{name.lower()}.ndjson")
+            with open(spill_path, "w", encoding="utf-8") as f:
+                for item in merge_shards(read_ndjson(path) for path in shard_paths):
+                    f.write(json.dumps(item, separators=(",", ":")))
+                    f.write("\n")
+            for path in shard_paths:
+                os.remove(path)
+            df = read_spill(spill_path)
+
+    if total > len(df):
+        print(f"Dropped {total - len(df)} duplicate {name.lower()} at shard boundaries")
+    return df
+
+def fetch_frame(tab: exports.Endpoint, scenario_id=None, spill_dir: str = None, shard: str = "none", max_workers: int = DEFAULT_WORKERS) -> pd.DataFrame:
+    """
+    Fetches one endpoint into a DataFrame, keeping only the tab's configured columns.
+
+    Args:
+        tab (exports.Endpoint): The tab's endpoint from the exports config.
+        scenario_id (str): Optional scenario ID.
+        spill_dir (str): If set, pages are streamed to an NDJSON file in this directory
+            and the DataFrame is built from disk, so only one page is held in memory while fetching.
+        shard (str): Date-window shard size for tabs with shard = true (one of SHARD_CHOICES).
+        max_workers (int): Maximum number of shards fetched at the same time.
+
+    Returns:
+        pd.DataFrame: The fetched items.
+    """
+    name, endpoint = tab.name, tab.endpoint
+    scenario = scenario_id or "PoR"
+    if tab.shard:
+        endpoints = shard_endpoint(endpoint, shard)
+        if len(endpoints) > 1:
+            # Shards are fetched and merged together, so this is a single stage
+            with run_metrics.stage("fetch", tab=name, scenario=scenario, shards=len(endpoints)) as stage:
+                df = tab.project(fetch_sharded(name, endpoints, scenario_id, spill_dir, max_workers))
+                stage.rows = len(df)
+            return df
+
+    if not spill_dir:
+        with run_metrics.stage("fetch", tab=name, scenario=scenario) as stage:
+            items = fetch_paginated(endpoint, scenario_id)
+            stage.rows = len(items)
+        with run_metrics.stage("build", tab=name, scenario=scenario) as stage:
+            df = tab.project(flatten_nested(pd.DataFrame(items)))
+            stage.rows = len(df)
+        return df
+
+    os.makedirs(spill_dir, exist_ok=True)
+    spill_path = os.path.join(spill_dir, f"{name.lower()}.ndjson")
+    with run_metrics.stage("fetch", tab=name, scenario=scenario) as stage:
+        stage.rows = api_client.spill_paginated(config.mp_url(), endpoint, config.mp_headers(), spill_path, scenario_id)
+    with run_metrics.stage("build", tab=name, scenario=scenario) as stage:
+        df = tab.project(read_spill(spill_path))
+        stage.rows = len(df)
+    return df
+
+def fetch_all_endpoints(tabs: dict, scenario_id=None, max_workers: int = DEFAULT_WORKERS, spill_dir: str = None, shard: str = "none",
+                        compact: bool = False) -> dict:
+    """
+    Fetches several endpoints concurrently, one worker per endpoint.
+
+    Args:
+        tabs (dict): Tab names mapped to exports.Endpoint entries.
+        scenario_id (str): Optional scenario ID passed to every endpoint.
+        max_workers (int): Maximum number of endpoints fetched at the same time.
+        spill_dir (str): Optional directory to stream pages to instead of holding them in memory.
+        shard (str): Date-window shard size for tabs with shard = true (one of SHARD_CHOICES).
+        compact (bool): Convert known columns to compact dtypes (see mp_schema).
+
+    Returns:
+        dict: Tab names mapped to DataFrames, in the same order as tabs.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {}
+        for name, tab in tabs.items():
+            print(f"Fetching {name.lower()}...")
+            futures[name] = executor.submit(fetch_frame, tab, scenario_id, spill_dir, shard, max_workers)
+
+        dataframes = {}
+        for name, future in futures.items():
+            dataframes[name] = future.result()
+            if compact:
+                with run_metrics.stage("schema", tab=name, scenario=scenario_id or "PoR") as stage:
+                    dataframes[name] = apply_schema(entity_for(tabs[name].endpoint), dataframes[name])
+                    stage.rows = len(dataframes[name])
+            print(f"Fetched {len(dataframes[name])} {name.lower()}")
+    return dataframes
 
 def authenticate_gsheets():
     # Authenticates with Google Sheets API using credentials
+    import gspread
+
     BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
     CRED_DIR = os.path.join(BASE_DIR, "credentials")
     
@@ -90,35 +263,57 @@ def authenticate_gsheets():
         print(f"Authentication failed: {e}")
         return None
 
-def write_to_gsheets(gc, spreadsheet_name: str, dataframes: dict):
+def write_to_gsheets(gc, spreadsheet_name: str, dataframes: dict, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                     max_workers: int = DEFAULT_SHEETS_WORKERS):
     """
-    Writes multiple DataFrames to tabs in a Google Sheet, replacing existing data.
+    Writes multiple DataFrames to tabs in a Google Sheet. Small tabs are updated
+    only where rows changed; large tabs are bulk uploaded in chunks. Tabs upload
+    in parallel, and LastUpdated is stamped only once every tab has been written.
     
     Args:
         gc: Authenticated gspread client.
         spreadsheet_name (str): Name of the Google Sheet.
         dataframes (dict): Dictionary where keys are tab names and values are DataFrames.
+        chunk_rows (int): Rows per request for bulk uploads.
+        max_workers (int): Tabs uploaded at the same time; the shared write pacer keeps them under the quota.
+
+    Raises:
+        gspread.SpreadsheetNotFound: If the spreadsheet doesn't exist or isn't shared with the service account.
+        Exception: The first tab failure, after the other tabs have finished.
     """
+    import gspread
+
     try:
         # Open the spreadsheet (must exist beforehand and be shared with service account)
         sh = gc.open(spreadsheet_name)
     except gspread.SpreadsheetNotFound:
         print(f"Spreadsheet '{spreadsheet_name}' not found.")
-        return
+        raise
 
+    # Look up every tab first; creating a missing one changes the spreadsheet, so this stays serial
+    worksheets = {}
     for sheet_name, df in dataframes.items():
         try:
             # Try to open the worksheet
-            worksheet = sh.worksheet(sheet_name)
-            # Clear existing contents
-            worksheet.clear()
+            worksheets[sheet_name] = sh.worksheet(sheet_name)
         except gspread.WorksheetNotFound:
-            # If it doesn't exist, create a new one
-            worksheet = sh.add_worksheet(title=sheet_name, rows="1000", cols="26")
+            # If it doesn't exist, create a new one sized for the data
+            worksheets[sheet_name] = sh.add_worksheet(title=sheet_name, rows=len(df) + 1, cols=max(len(df.columns), 1))
 
-        # Replace NaN with empty strings and convert to strings
-        values = [df.columns.tolist()] + df.fillna("").astype(str).values.tolist()
-        worksheet.update(values)
+    def upload(sheet_name):
+        df = dataframes[sheet_name]
+        with run_metrics.stage("gsheets", spreadsheet=spreadsheet_name, tab=sheet_name) as stage:
+            write_frame(worksheets[sheet_name], df, chunk_rows)
+            stage.rows = len(df)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(dataframes)))) as executor:
+        futures = {sheet_name: executor.submit(run_metrics.wrap(upload), sheet_name) for sheet_name in dataframes}
+    failed = {sheet_name: future.exception() for sheet_name, future in futures.items() if future.exception()}
+    if failed:
+        for sheet_name, e in failed.items():
+            print(f"❌ ERROR: Tab '{sheet_name}' in '{spreadsheet_name}' failed: {e}")
+        print(f"LastUpdated in '{spreadsheet_name}' left unchanged.")
+        raise next(iter(failed.values()))
 
      # Add timestamp sheet
     timestamp_sheet_name = "LastUpdated"
@@ -133,14 +328,15 @@ def write_to_gsheets(gc, spreadsheet_name: str, dataframes: dict):
    
     print(f"Data written to Google Sheet '{spreadsheet_name}'")    
 
-def write_to_excel(dataframes: dict, output_dir: str = "Data") -> tuple:
+def export_path(output_dir: str = "Data", label: str = None, extension: str = "xlsx") -> tuple:
     """
-    Writes multiple DataFrames to a timestamped Excel file.
-    
+    Builds a timestamped export path inside the repo, creating the directory if needed.
+
     Args:
-        dataframes (dict): Dictionary where keys are sheet names and values are DataFrames.
-        output_dir (str): Directory where the Excel file will be saved.
-        
+        output_dir (str): Directory under the repo root.
+        label (str): Optional scenario label added to the name.
+        extension (str): File extension, or "" for a directory name.
+
     Returns:
         tuple: (output_filepath, output_filename)
     """
@@ -153,105 +349,534 @@ def write_to_excel(dataframes: dict, output_dir: str = "Data") -> tuple:
 
     # Build timestamped filename
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_filename = f"meisterplan_full_export_{timestamp}.xlsx"
-    output_filepath = os.path.join(DATA_DIR, output_filename)
+    if label:
+        output_filename = f"meisterplan_full_export_{safe_label(label)}_{timestamp}"
+    else:
+        output_filename = f"meisterplan_full_export_{timestamp}"
+    if extension:
+        output_filename += f".{extension}"
+    return os.path.join(DATA_DIR, output_filename), output_filename
+
+def _excel_cell(value):
+    # Value that xlsxwriter can write natively; blanks for missing values
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if value is None or value is pd.NaT or value is pd.NA or (isinstance(value, float) and value != value):
+        return None
+    return value
+
+def write_excel_streaming(dataframes: dict, filepath: str):
+    """
+    Writes DataFrames to an xlsx file with xlsxwriter in constant_memory mode.
+    Rows are flushed to disk as they are written, so memory stays flat regardless of row count.
+
+    Args:
+        dataframes (dict): Dictionary where keys are sheet names and values are DataFrames.
+        filepath (str): Output xlsx path.
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(filepath, {
+        "constant_memory": True,
+        "remove_timezone": True,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss"
+    })
+    for sheet_name, df in dataframes.items():
+        worksheet = workbook.add_worksheet(sheet_name)
+        # constant_memory requires writing strictly row by row
+        worksheet.write_row(0, 0, [str(c) for c in df.columns])
+        for row_index, row in enumerate(df.itertuples(index=False, name=None), start=1):
+            worksheet.write_row(row_index, 0, [_excel_cell(v) for v in row])
+    workbook.close()
+
+def write_to_excel(dataframes: dict, output_dir: str = "Data", label: str = None, engine: str = "openpyxl") -> tuple:
+    """
+    Writes multiple DataFrames to a timestamped Excel file.
+    
+    Args:
+        dataframes (dict): Dictionary where keys are sheet names and values are DataFrames.
+        output_dir (str): Directory where the Excel file will be saved.
+        label (str): Optional scenario label added to the file name.
+        engine (str): "openpyxl" builds the workbook in memory; "xlsxwriter" streams it
+            to disk in constant memory.
+        
+    Returns:
+        tuple: (output_filepath, output_filename)
+    """
+    output_filepath, output_filename = export_path(output_dir, label, "xlsx")
 
     # Write DataFrames to Excel
-    with pd.ExcelWriter(output_filepath, engine='openpyxl') as writer:
-        for sheet_name, df in dataframes.items():
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
+    with run_metrics.stage("excel", engine=engine, scenario=label) as stage:
+        if engine == "xlsxwriter":
+            write_excel_streaming(dataframes, output_filepath)
+        else:
+            with pd.ExcelWriter(output_filepath, engine='openpyxl') as writer:
+                for sheet_name, df in dataframes.items():
+                    df.to_excel(writer, sheet_name=sheet_name, index=False)
+        stage.rows = sum(len(df) for df in dataframes.values())
 
     print(f"Excel file written to {output_filepath}")
     return output_filepath, output_filename
 
-def main(output_mode="gsheets", scenario_id=None):
-    if scenario_id:
-        print(f"Fetching data from Scenario ID: {scenario_id}")
-        spreadsheet = "Meisterplan Resource Map 2 - Scenario"
-    else:
-        print(f"Fetching data from Plan of Record")
-        spreadsheet = "Meisterplan Resource Map 1 - PoR" 
-    
-    # OLD CODE BLOCK
-    print("Fetching projects...")
-    projects = fetch_paginated("projects?startDate=2024-01-01&finishDate=2030-12-31", scenario_id)
-    print("Fetching allocations...")
-    allocations = fetch_paginated("allocationSlices?startDate=2025-07-01&finishDate=2027-12-31&aggregation=MONTH", scenario_id)
-    print("Fetching financial events...")
-    financials = fetch_paginated("financials?startDate=2024-01-01&finishDate=2030-12-31", scenario_id)
-    print("Fetching milestones...")
-    milestones = fetch_paginated("milestones?startDate=2024-01-01&finishDate=2030-12-31", scenario_id)
-    print("Fetching resources...")
-    resources = fetch_paginated("resources", scenario_id)
-
-    # NEW CODE BLOCK
-    # print("Fetching projects...")
-    # projects = fetch_paginated("projects?", scenario_id)
-    # print("Fetching allocations...")
-    # allocations = fetch_paginated("allocationSlices?aggregation=MONTH", scenario_id)
-    # print("Fetching financial events...")
-    # financials = fetch_paginated("financials", scenario_id)
-    # print("Fetching milestones...")
-    # milestones = fetch_paginated("milestones", scenario_id)
-    # print("Fetching resources...")
-    # resources = fetch_paginated("resources", scenario_id)
-
-
-    # Create dataframes
-    df_projects = pd.DataFrame(projects)
-    df_allocations = pd.DataFrame(allocations)
-    df_financials = pd.DataFrame(financials)
-    df_milestones = pd.DataFrame(milestones)
-    df_resources = pd.DataFrame(resources)
-
-    dataframes = {
-        "Projects": df_projects,
-        "Allocations": df_allocations,
-        "Financials": df_financials,
-        "Milestones": df_milestones,
-        "Resources": df_resources
-    }
-    
-    # THIS BLOCK WRITES TO EXCEL
-    if output_mode in ("excel", "both"):
-        excel_path, excel_filename = write_to_excel(dataframes)
+def write_to_files(dataframes: dict, file_format: str, output_dir: str = "Data", label: str = None) -> str:
+    """
+    Writes each DataFrame to its own Parquet or CSV file in a timestamped directory.
+
+    Args:
+        dataframes (dict): Dictionary where keys are tab names and values are DataFrames.
+        file_format (str): "parquet" or "csv".
+        output_dir (str): Directory where the export directory will be created.
+        label (str): Optional scenario label added to the directory name.
+
+    Returns:
+        str: The export directory.
+    """
+    export_dir, _ = export_path(output_dir, label, "")
+    os.makedirs(export_dir, exist_ok=True)
+
+    for sheet_name, df in dataframes.items():
+        filepath = os.path.join(export_dir, f"{safe_label(sheet_name)}.{file_format}")
+        with run_metrics.stage(file_format, tab=sheet_name, scenario=label) as stage:
+            if file_format == "parquet":
+                # Nested objects (dicts/lists) are stored as JSON text so every column has one type
+                nested = [c for c in df.columns if df[c].dtype == object and df[c].map(lambda v: isinstance(v, (dict, list))).any()]
+                if nested:
+                    df = df.assign(**{c: df[c].map(lambda v: json.dumps(v) if isinstance(v, (dict, list)) else v) for c in nested})
+                df.to_parquet(filepath, index=False)
+            else:
+                df.to_csv(filepath, index=False)
+            stage.rows = len(df)
+
+    print(f"{file_format} files written to {export_dir}")
+    return export_dir
+
+def fetch_scenarios_data(tabs: dict, scenarios: dict, max_workers: int = DEFAULT_WORKERS, spill_dir: str = None, shard: str = "none",
+                         compact: bool = False) -> dict:
+    """
+    Fetches every scenario concurrently in one process. Scenario-independent tabs
+    (shared = true) are fetched once and shared by all scenarios.
+
+    Args:
+        tabs (dict): Tab names mapped to exports.Endpoint entries, in tab order.
+        scenarios (dict): Scenario labels mapped to scenario IDs (None for the Plan of Record).
+        max_workers (int): Threads per scenario, endpoint and shard pool; requests in flight are capped by api_client.set_max_in_flight.
+        spill_dir (str): Optional directory to stream pages to; each scenario gets its own subdirectory.
+        shard (str): Date-window shard size for tabs with shard = true (one of SHARD_CHOICES).
+        compact (bool): Convert known columns to compact dtypes (see mp_schema).
+
+    Returns:
+        dict: Scenario labels mapped to dictionaries of tab names and DataFrames.
+    """
+    shared_endpoints = {name: tab for name, tab in tabs.items() if tab.shared}
+    scenario_endpoints = {name: tab for name, tab in tabs.items() if not tab.shared}
+
+    def scenario_spill_dir(label):
+        return os.path.join(spill_dir, safe_label(label)) if spill_dir else None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(scenarios) + 1, max_workers))) as executor:
+        shared_future = executor.submit(fetch_all_endpoints, shared_endpoints, None, max_workers, scenario_spill_dir("shared"), shard, compact)
+        futures = {}
+        for label, scenario_id in scenarios.items():
+            if scenario_id:
+                print(f"Fetching data from Scenario '{label}' (ID: {scenario_id})")
+            else:
+                print(f"Fetching data from Plan of Record")
+            futures[label] = executor.submit(fetch_all_endpoints, scenario_endpoints, scenario_id, max_workers, scenario_spill_dir(label), shard, compact)
+
+        shared = shared_future.result()
+        results = {}
+        for label, future in futures.items():
+            frames = future.result()
+            # Keep the tab order of the exports config
+            results[label] = {name: frames[name] if name in frames else shared[name] for name in tabs}
+    return results
+
+def safe_label(label: str) -> str:
+    # Scenario label usable in file and directory names
+    return re.sub(r"[^\w-]+", "_", label)
+
+def spreadsheet_for(label: str, scenario_id=None, batch: bool = False, registry: exports.Registry = None) -> str:
+    # Target Google Sheet for a scenario; batch runs get one sheet per scenario
+    registry = registry or exports.load()
+    if not scenario_id:
+        return registry.por_spreadsheet
+    if not batch:
+        return registry.scenario_spreadsheet
+    return f"{registry.scenario_spreadsheet} ({label})"
+
+def resolve_scenarios(scenario_inputs: list = None, all_scenarios: bool = False) -> dict:
+    """
+    Turns command-line scenario arguments into scenario labels and IDs.
+
+    Args:
+        scenario_inputs (list): Aliases (from .env file) or direct scenario IDs.
+        all_scenarios (bool): Export the Plan of Record plus every scenario returned by the API.
+
+    Returns:
+        dict: Scenario labels mapped to scenario IDs (None for the Plan of Record).
+    """
+    if all_scenarios:
+        aliases_by_id = {scenario_id: alias for alias, scenario_id in config.scenario_aliases().items()}
+        listed = [(aliases_by_id.get(s["scenarioId"], s["scenarioName"]), s["scenarioId"]) for s in get_scenarios.fetch_scenarios()]
+        # Scenarios sharing a name (or named "PoR") get their ID added, so none overwrites another
+        counts = Counter(label for label, _ in listed)
+        scenarios = {"PoR": None}
+        for label, scenario_id in listed:
+            if counts[label] > 1 or label == "PoR":
+                label = f"{label} ({scenario_id})"
+            scenarios[label] = scenario_id
+        return scenarios
+
+    if not scenario_inputs:
+        return {"PoR": None}
+
+    # Known aliases map to their scenario ID, anything else is assumed to be a direct ID
+    return {scenario_input: config.resolve_scenario(scenario_input) for scenario_input in scenario_inputs}
+
+def output_names(output_mode: str, scenarios: dict, registry: exports.Registry = None) -> list:
+    # What one run writes, per scenario; the response cache records the data hash each of them last received
+    batch = len(scenarios) > 1
+    names = []
+    for label, scenario_id in scenarios.items():
+        target = spreadsheet_for(label, scenario_id, batch, registry) if output_mode in ("gsheets", "both") else scenario_id or "PoR"
+        names.append(f"{output_mode}:{label}:{target}")
+    return names
+
+def write_outputs(results: dict, output_mode: str, scenarios: dict, gc=None, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                  excel_engine: str = "openpyxl", output_dir: str = "Data", sheets_workers: int = DEFAULT_SHEETS_WORKERS,
+                  registry: exports.Registry = None):
+    """
+    Runs every output sink concurrently: one file writer and one Google Sheets
+    writer per scenario, so the export takes about as long as the slowest sink.
+
+    Args:
+        results (dict): Scenario labels mapped to dictionaries of tab names and DataFrames.
+        output_mode (str): "gsheets", "excel", "both", "parquet" or "csv".
+        scenarios (dict): Scenario labels mapped to scenario IDs (None for the Plan of Record).
+        gc: Authenticated gspread client; Google Sheets is skipped when None.
+        chunk_rows (int): Rows per request for Sheets bulk uploads.
+        excel_engine (str): "openpyxl" or "xlsxwriter".
+        output_dir (str): Directory for Excel/Parquet/CSV files.
+        sheets_workers (int): Tabs uploaded at the same time per spreadsheet.
+        registry (exports.Registry): Exports config with the spreadsheet names (default: loaded from exports.toml).
+
+    Raises:
+        Exception: The first sink failure, after the other sinks have finished.
+    """
+    batch = len(results) > 1
+    sinks = {}
+    for label, dataframes in results.items():
+        file_label = label if batch else None
+        if output_mode in ("excel", "both"):
+            sinks[f"Excel ({label})"] = lambda d=dataframes, l=file_label: write_to_excel(d, output_dir, l, excel_engine)
+        if output_mode in ("parquet", "csv"):
+            sinks[f"{output_mode} ({label})"] = lambda d=dataframes, l=file_label: write_to_files(d, output_mode, output_dir, l)
+        if output_mode in ("gsheets", "both") and gc:
+            spreadsheet = spreadsheet_for(label, scenarios.get(label), batch, registry)
+            sinks[f"Google Sheets ({label})"] = lambda d=dataframes, name=spreadsheet: write_to_gsheets(gc, name, d, chunk_rows, sheets_workers)
+    if not sinks:
+        return
+
+    with ThreadPoolExecutor(max_workers=len(sinks)) as executor:
+        futures = {name: executor.submit(run_metrics.wrap(sink)) for name, sink in sinks.items()}
+    failed = {name: future.exception() for name, future in futures.items() if future.exception()}
+    for name, e in failed.items():
+        print(f"❌ ERROR: {name} failed: {e}")
+    if failed:
+        raise next(iter(failed.values()))
+
+def _hashable(col: pd.Series) -> pd.Series:
+    # Nested objects (dicts / lists) can't be hashed by pandas; hash their JSON text instead
+    return col.map(lambda v: json.dumps(v, sort_keys=True) if isinstance(v, (dict, list)) else v)
+
+def frames_hash(results: dict) -> str:
+    """
+    Content hash of an export, independent of row storage but sensitive to order and values.
+
+    Args:
+        results (dict): Scenario labels mapped to dictionaries of tab names and DataFrames.
+
+    Returns:
+        str: Hex digest; equal digests mean there is nothing new to write.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for label, dataframes in results.items():
+        for name, df in dataframes.items():
+            digest.update(json.dumps([label, name, [str(c) for c in df.columns], len(df)]).encode())
+            for column in df.columns:
+                try:
+                    hashes = pd.util.hash_pandas_object(df[column], index=False)
+                except TypeError:
+                    hashes = pd.util.hash_pandas_object(_hashable(df[column]), index=False)
+                digest.update(hashes.to_numpy().tobytes())
+    return digest.hexdigest()
+
+def main(output_mode="gsheets", scenarios=None, max_workers=DEFAULT_WORKERS, spill_dir=None, shard="none", cache_path=None,
+         chunk_rows=DEFAULT_CHUNK_ROWS, excel_engine="openpyxl", compact_types=False, snapshot_path=None,
+         gc=None, last_hash=None, checkpoint_dir=None, utilisation=True, sheets_workers=DEFAULT_SHEETS_WORKERS,
+         exports_path=None) -> str:
+    """
+    Fetches the scenarios and writes them to the chosen outputs.
+
+    Args:
+        gc: Authenticated gspread client to reuse; authenticates when None.
+        last_hash (str): frames_hash of the previous run; writers are skipped when the data still matches it.
+        checkpoint_dir (str): Save every fetched page here and resume from the pages a failed run left behind.
+        utilisation (bool): Add the resource and team demand vs capacity tabs (see utilisation.py).
+        sheets_workers (int): Google Sheets tabs uploaded at the same time per spreadsheet.
+        exports_path (str): Exports config with the tabs, windows, columns and spreadsheets (default: Scripts/exports.toml).
+
+    Returns:
+        str: frames_hash of the fetched data, once every output was written (last_hash
+            when Google Sheets could not be reached).
+
+    Raises:
+        Exception: If a writer fails; the hash is not returned, so the next run writes again.
+    """
+    scenarios = scenarios or {"PoR": None}
+    # Fail before any work if the Meisterplan settings are missing
+    config.require("MP_URL", "MP_TOKEN")
+    # Read on every run, so relative date windows follow the calendar
+    registry = exports.load(exports_path)
+
+    # Incremental mode: unchanged pages are served from the local cache
+    cache = None
+    if cache_path:
+        cache = ResponseCache(cache_path)
+        api_client.set_cache(cache)
+
+    # Resumable mode: saved pages are replayed and each endpoint continues from its saved cursor
+    checkpoint_store = None
+    if checkpoint_dir:
+        checkpoint_store = checkpoints.CheckpointStore(checkpoint_dir)
+        api_client.set_checkpoints(checkpoint_store)
+
+    # Fetch all scenarios and endpoints in parallel into dataframes; any failed request aborts the export.
+    # The nested scenario/endpoint/shard pools share one cap on requests in flight.
+    api_client.set_max_in_flight(max_workers)
+    outputs = output_names(output_mode, scenarios, registry)
+    published = False
+    try:
+        results = fetch_scenarios_data(registry.tabs, scenarios, max_workers, spill_dir, shard, compact_types)
+        data_hash = frames_hash(results)
+        if cache:
+            print(f"Cache: {cache.changed} changed pages, {cache.unchanged} unchanged")
+            # Unchanged pages only mean something once the same data has actually been written
+            published = cache.is_written(outputs, data_hash)
+    except requests.RequestException as e:
+        print(f"Fetch failed, nothing was written: {e}")
+        raise
+    finally:
+        if cache:
+            api_client.set_cache(None)
+            cache.close()
+        if checkpoint_store:
+            api_client.set_checkpoints(None)
+
+    if checkpoint_store and checkpoint_store.resumed_pages:
+        print(f"Resumed {checkpoint_store.resumed_pages} saved pages from {checkpoint_store.resumed_endpoints} endpoints in {checkpoint_dir}")
+
+    if published:
+        print("No changes since the last successful write, skipping writers.")
+        return data_hash
+
+    if data_hash == last_hash:
+        print("Data unchanged since the last run, skipping writers.")
+        return data_hash
+
+    # Keep a local, queryable history of every export
+    if snapshot_path:
+        store = SnapshotStore(snapshot_path)
+        try:
+            for label, dataframes in results.items():
+                with run_metrics.stage("snapshot", scenario=label) as stage:
+                    snapshot_id = store.append(label, dataframes, scenarios[label])
+                    stage.rows = sum(len(df) for df in dataframes.values())
+                print(f"Snapshot {snapshot_id} stored for '{label}' in {snapshot_path}")
+        finally:
+            store.close()
     
-    # THIS BLOCK WRITES TO GOOGLE SHEETS
+    # Precomputed demand vs capacity tabs, written alongside the raw data (not stored as snapshots)
+    if utilisation:
+        for label, dataframes in results.items():
+            with run_metrics.stage("utilisation", scenario=label) as stage:
+                tabs = utilisation_tabs(dataframes.get("Allocations"), dataframes.get("Resources"))
+                stage.rows = sum(len(df) for df in tabs.values())
+            dataframes.update(tabs)
+
+    # Every sink (Excel, Parquet/CSV, Google Sheets) writes at the same time
     if output_mode in ("gsheets", "both"):
-        gc = authenticate_gsheets()
-        if not gc:
-            return
-        write_to_gsheets(gc, spreadsheet, dataframes)
+        gc = gc or authenticate_gsheets()
+    write_outputs(results, output_mode, scenarios, gc, chunk_rows, excel_engine, sheets_workers=sheets_workers, registry=registry)
+    if output_mode in ("gsheets", "both") and not gc:
+        # Nothing reached the sheets, so the next run must write again
+        return last_hash
 
-if __name__ == "__main__":
+    # Only now may a later incremental run skip the writers for this data
+    if cache_path:
+        cache = ResponseCache(cache_path)
+        try:
+            cache.mark_written(outputs, data_hash)
+        finally:
+            cache.close()
+    return data_hash
+
+def cli(argv=None, prog=None):
     # Set up a more robust command-line argument parser
     parser = argparse.ArgumentParser(
-        description="Fetch data from Meisterplan and export to Excel or Google Sheets. Can specify a scenario."
+        prog=prog,
+        description="Fetch data from Meisterplan and export to Excel or Google Sheets. Can specify one or more scenarios."
     )
     parser.add_argument(
         "-m", "--output-mode", 
-        choices=["gsheets", "excel", "both"], 
+        choices=["gsheets", "excel", "both", "parquet", "csv"], 
         default="gsheets", 
-        help="Specify the output destination (default: gsheets)."
+        help="Specify the output destination (default: gsheets). parquet and csv write one file per tab."
     )
     parser.add_argument(
+        "--excel-engine",
+        choices=["openpyxl", "xlsxwriter"],
+        default="openpyxl",
+        help="Excel writer: openpyxl (in memory) or xlsxwriter (streaming, constant memory). Default: openpyxl."
+    )
+    scenario_group = parser.add_mutually_exclusive_group()
+    scenario_group.add_argument(
         "-s", "--scenario-id", 
-        help="The alias (from .env file) or direct ID of the Meisterplan scenario. If omitted, fetches the Plan of Record."
+        action="append",
+        help="The alias (from .env file) or direct ID of a Meisterplan scenario. Repeat to export several scenarios in one run. If omitted, fetches the Plan of Record."
     )
-    args = parser.parse_args()
-
-    # *** UPDATED: Look up the scenario alias and get the real ID ***
-    scenario_input = args.scenario_id
-    final_scenario_id = None
+    scenario_group.add_argument(
+        "--all-scenarios",
+        action="store_true",
+        help="Export the Plan of Record and every scenario in Meisterplan in one run."
+    )
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Maximum Meisterplan requests in flight at once, across all scenarios, endpoints and shards (default: {DEFAULT_WORKERS}). Use 1 for serial fetching."
+    )
+    parser.add_argument(
+        "--spill-dir",
+        help="Stream fetched pages to NDJSON files in this directory instead of holding them in memory."
+    )
+    parser.add_argument(
+        "--alloc-shard",
+        choices=SHARD_CHOICES,
+        default="none",
+        help="Split the date range of the sharded tabs (Allocations by default) into month/quarter/year windows fetched in parallel (default: none)."
+    )
+    parser.add_argument(
+        "--exports-config",
+        help="TOML file with the tabs, date windows, columns and spreadsheets to export (default: Scripts/exports.toml)."
+    )
+    parser.add_argument(
+        "-i", "--incremental",
+        action="store_true",
+        help="Use the local response cache and skip writing when nothing changed since the last run."
+    )
+    parser.add_argument(
+        "--cache-path",
+        default=DEFAULT_CACHE_PATH,
+        help="SQLite file for the --incremental response cache (default: Cache/responses.sqlite)."
+    )
+    parser.add_argument(
+        "--json-decoder",
+        choices=list(api_client.DECODERS),
+        help="JSON decoder for API pages (default: the fastest installed, orjson when available)."
+    )
+    parser.add_argument(
+        "--compact-types",
+        action="store_true",
+        help="Store IDs and names as categoricals, dates as datetimes and measures as floats (see mp_schema.py)."
+    )
+    parser.add_argument(
+        "--no-snapshot",
+        action="store_true",
+        help="Don't append this run to the local snapshot history."
+    )
+    parser.add_argument(
+        "--snapshot-path",
+        default=DEFAULT_STORE_PATH,
+        help="SQLite file for the snapshot history (default: Data/snapshots.sqlite)."
+    )
+    parser.add_argument(
+        "--no-utilisation",
+        action="store_true",
+        help="Don't add the precomputed Resource Utilisation and Team Utilisation tabs."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Checkpoint every fetched page and continue from the last saved page of a failed run."
+    )
+    parser.add_argument(
+        "--checkpoint-dir",
+        default=checkpoints.DEFAULT_CHECKPOINT_DIR,
+        help="Directory for the --resume page checkpoints (default: Checkpoints/)."
+    )
+    parser.add_argument(
+        "--metrics-path",
+        default=run_metrics.DEFAULT_METRICS_PATH,
+        help="JSON lines file per-stage run metrics are appended to (default: Logs/metrics.jsonl)."
+    )
+    parser.add_argument(
+        "--no-metrics",
+        action="store_true",
+        help="Don't write per-stage run metrics."
+    )
+    parser.add_argument(
+        "--prometheus-file",
+        help="Also write the run metrics to this Prometheus textfile (e.g. for node_exporter's textfile collector)."
+    )
+    parser.add_argument(
+        "--sheets-chunk-rows",
+        type=int,
+        default=DEFAULT_CHUNK_ROWS,
+        help=f"Rows per request when bulk uploading large tabs to Google Sheets (default: {DEFAULT_CHUNK_ROWS})."
+    )
+    parser.add_argument(
+        "--sheets-workers",
+        type=int,
+        default=DEFAULT_SHEETS_WORKERS,
+        help=f"Google Sheets tabs uploaded in parallel, all within the shared write quota (default: {DEFAULT_SHEETS_WORKERS})."
+    )
+    args = parser.parse_args(argv)
+    if args.json_decoder:
+        api_client.set_decoder(args.json_decoder)
 
-    if scenario_input:
-        # Check if the input from the command line is a known alias
-        if scenario_input in scenarios_from_env:
-            final_scenario_id = scenarios_from_env[scenario_input]
-            print(f"Found alias '{scenario_input}'. Using Scenario ID: {final_scenario_id}")
-        else:
-            # If it's not an alias, assume it's the direct ID
-            final_scenario_id = scenario_input
+    run_metrics.start_run("get_allMPdata", None if args.no_metrics else args.metrics_path, args.prometheus_file)
+    status = "error"
+    try:
+        # *** UPDATED: Look up the scenario aliases and get the real IDs ***
+        main(
+            output_mode=args.output_mode,
+            scenarios=resolve_scenarios(args.scenario_id, args.all_scenarios),
+            max_workers=args.workers,
+            spill_dir=args.spill_dir,
+            shard=args.alloc_shard,
+            cache_path=args.cache_path if args.incremental else None,
+            chunk_rows=args.sheets_chunk_rows,
+            excel_engine=args.excel_engine,
+            compact_types=args.compact_types,
+            snapshot_path=None if args.no_snapshot else args.snapshot_path,
+            checkpoint_dir=args.checkpoint_dir if args.resume else None,
+            utilisation=not args.no_utilisation,
+            sheets_workers=args.sheets_workers,
+            exports_path=args.exports_config
+        )
+        status = "ok"
+        # A completed export leaves nothing to resume
+        checkpoints.clear(args.checkpoint_dir)
+    except config.ConfigError as e:
+        print(e)
+        exit(1)
+    except requests.RequestException:
+        if args.resume:
+            print("Run again with --resume to continue from the last saved page.")
+        exit(1)
+    finally:
+        run_metrics.finish_run(status)
 
-    # Call the main function with the correct (looked-up) scenario ID
-    main(output_mode=args.output_mode, scenario_id=final_scenario_id)
+if __name__ == "__main__":
+    cli()
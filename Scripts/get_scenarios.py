@@ -1,30 +1,26 @@
 # get_scenarios.py
-import os
-import requests
-from dotenv import load_dotenv
-
-load_dotenv()
-
-MP_URL = os.getenv("MP_URL")
-MP_TOKEN = os.getenv("MP_TOKEN")
-
-headers = {
-    "Authorization": f"Bearer {MP_TOKEN}",
-    "Accept": "application/json"
-}
+import argparse
+import api_client
+import config
 
 def fetch_scenarios():
-    scenurl = f"{MP_URL}/scenarios"
-    response = requests.get(scenurl, headers=headers)
+    # Lists all scenarios and returns them as dictionaries with scenarioId and scenarioName
+    scenurl = f"{config.mp_url()}/scenarios"
+    data = api_client.get_json(scenurl, headers=config.mp_headers())
+    scenarios = data.get("items", [])
+
+    print("Scenarios:")
+    for s in scenarios:
+        print(f"- {s['scenarioName']} (ID: {s['scenarioId']})")
+    return scenarios
 
-    if response.ok:
-        data = response.json()
-        print("Scenarios:")
-        for s in data.get("items", []):
-            print(f"- {s['scenarioName']} (ID: {s['scenarioId']})")
-    else:
-        print("Error fetching scenarios:", response.status_code)
-        print(response.text)
+def cli(argv=None, prog=None):
+    argparse.ArgumentParser(prog=prog, description="List the Meisterplan scenarios.").parse_args(argv)
+    try:
+        fetch_scenarios()
+    except config.ConfigError as e:
+        print(e)
+        exit(1)
 
 if __name__ == "__main__":
-    fetch_scenarios()
\ No newline at end of file
+    cli()
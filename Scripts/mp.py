@@ -0,0 +1,44 @@
+# mp.py
+# Single entry point for the export scripts:
+#   python Scripts/mp.py export -m parquet
+#   python Scripts/mp.py asana -s whatif
+#   python Scripts/mp.py scenarios
+#   python Scripts/mp.py daemon --mp-every 30 --asana-every 10
+# Only the module behind the chosen command is imported, so listing scenarios
+# or printing help doesn't load pandas, gspread or the Excel writers. The
+# scripts can still be run directly as before.
+import importlib
+import sys
+
+# command -> (module, description)
+COMMANDS = {
+    "export": ("get_allMPdata", "Export Meisterplan data to Google Sheets, Excel, Parquet or CSV."),
+    "asana": ("get_AsanaTime", "Sync Asana and Meisterplan milestones to the mapping sheet."),
+    "scenarios": ("get_scenarios", "List the Meisterplan scenarios."),
+    "projects": ("get_projects", "Save every Meisterplan project to an Excel file."),
+    "diff": ("snapshot_diff", "Show what changed between two exports."),
+    "snapshots": ("snapshot_store", "Query the local snapshot history."),
+    "daemon": ("daemon", "Run the export and the Asana sync on schedules in one long-lived process."),
+}
+
+def usage() -> str:
+    lines = ["usage: mp.py <command> [options]", "", "commands:"]
+    lines += [f"  {name:<10} {description}" for name, (_, description) in COMMANDS.items()]
+    lines += ["", "Run 'mp.py <command> -h' for the options of a command."]
+    return "\n".join(lines)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f"Unknown command '{command}'.\n\n{usage()}")
+        exit(2)
+
+    module = importlib.import_module(COMMANDS[command][0])
+    module.cli(rest, prog=f"mp.py {command}")
+
+if __name__ == "__main__":
+    main()
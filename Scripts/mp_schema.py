@@ -0,0 +1,169 @@
+# mp_schema.py
+# Column dtypes for Meisterplan entities.
+# API payloads arrive as JSON strings and numbers, so pd.DataFrame(items) leaves
+# every column as object. apply_schema converts the known columns to compact
+# dtypes: repeated IDs and names become categoricals, dates become datetime64,
+# and measures become floats. Only columns present in the frame are touched, and
+# values that fail to parse become NaN/NaT rather than raising.
+#
+# flatten_nested runs first, on every fetched frame: nested objects become
+# dotted columns (owner.name) and lists become JSON text, so no cell is left
+# holding a Python dict or list.
+import json
+import pandas as pd
+
+# Joins parent and child keys of flattened columns
+FLATTEN_SEP = "."
+
+# Entity (endpoint path) -> column -> dtype, using the field names of the real
+# payloads (see the exports in Data/). Repeated IDs, names and enum values become
+# categoricals; IDs unique to every row are left alone, where a categorical
+# would only add a lookup table.
+SCHEMAS = {
+    "projects": {
+        "scenarioId": "category",
+        "scenarioName": "category",
+        "projectType": "category",
+        "projectCostType": "category",
+        "projectStatus": "category",
+        "projectRankCategory": "category",
+        "projectManagerId": "category",
+        "projectManagerName": "category",
+        "businessGoalName": "category",
+        "programName": "category",
+        "projectStart": "datetime64",
+        "projectFinish": "datetime64",
+        "cust_launch_quarter": "category",
+        "cust_gantt_include": "category",
+        "cust_hero": "category",
+        "cust_stage_gate": "category",
+        "cust_launch_type": "category",
+        "obs_Product Line": "category",
+    },
+    "allocationSlices": {
+        "scenarioProjectId": "category",
+        "projectName": "category",
+        "resourceType": "category",
+        "resourceId": "category",
+        "resourceName": "category",
+        "allocationProjectRoleId": "category",
+        "allocationProjectRoleName": "category",
+        "allocationStart": "datetime64",
+        "allocationFinish": "datetime64",
+        "allocationHours": "float32",
+        "allocationFte": "float32",
+        # Money stays float64 so cents survive
+        "allocationCost": "float64",
+        "allocationBenefit": "float64",
+        "allocationCostType": "category",
+    },
+    "financials": {
+        "scenarioProjectId": "category",
+        "financialsDate": "datetime64",
+        "financialsValue": "float64",
+        "financialsFinanceType": "category",
+        "financeCategoryName": "category",
+    },
+    "milestones": {
+        "scenarioProjectId": "category",
+        "milestoneName": "category",
+        "milestoneDate": "datetime64",
+        "projectPhaseName": "category",
+        "projectPhaseColor": "category",
+    },
+    # No Resources tab in the saved exports; names follow the allocation payloads
+    "resources": {
+        "resourceId": "category",
+        "resourceName": "category",
+        "resourceType": "category",
+    },
+}
+
+def entity_for(endpoint: str) -> str:
+    # "allocationSlices?startDate=..." -> "allocationSlices"
+    return endpoint.partition("?")[0].strip("/")
+
+def _json_text(value):
+    return json.dumps(value, separators=(",", ":")) if isinstance(value, (dict, list)) else value
+
+def flatten_nested(df: pd.DataFrame, sep: str = FLATTEN_SEP) -> pd.DataFrame:
+    """
+    Expands nested objects into columns in one pass over the frame.
+    Only object columns that pandas can't type as plain scalars are inspected,
+    so flat payloads (the usual case) cost next to nothing.
+
+    Args:
+        df (pd.DataFrame): Frame built from API items.
+        sep (str): Separator between parent and child keys.
+
+    Returns:
+        pd.DataFrame: The frame with each all-object column replaced by its
+        flattened fields at the same position, and lists (or mixed values) as JSON text.
+    """
+    columns = {}
+    changed = False
+    for name in df.columns:
+        col = df[name]
+        if col.dtype != object or pd.api.types.infer_dtype(col, skipna=True) in ("string", "integer", "floating", "boolean", "empty", "mixed-integer-float"):
+            columns[name] = col
+            continue
+        values = col.to_numpy()
+        present = col.notna().to_numpy()
+        is_dict = [isinstance(v, dict) for v in values]
+        nested = None
+        if any(is_dict) and all(d or not p for d, p in zip(is_dict, present)):
+            # Every value is an object (or missing): its keys become columns, recursively
+            nested = flatten_nested(pd.DataFrame([v if d else {} for v, d in zip(values, is_dict)], index=df.index), sep)
+        if nested is not None and len(nested.columns):
+            for sub_name in nested.columns:
+                columns[f"{name}{sep}{sub_name}"] = nested[sub_name]
+            changed = True
+        elif any(isinstance(v, (dict, list)) for v in values):
+            columns[name] = col.map(_json_text)
+            changed = True
+        else:
+            columns[name] = col
+    return pd.DataFrame(columns, index=df.index) if changed else df
+
+def _convert(col: pd.Series, dtype: str) -> pd.Series:
+    if dtype == "category":
+        # Nested objects (dicts/lists) are unhashable and stay as they are
+        if col.map(lambda v: isinstance(v, (dict, list))).any():
+            return col
+        return col.astype("category")
+    if dtype == "datetime64":
+        return pd.to_datetime(col, errors="coerce", format="ISO8601")
+    return pd.to_numeric(col, errors="coerce").astype(dtype)
+
+def format_dates(col: pd.Series) -> pd.Series:
+    """
+    Formats a datetime column as text: date-only columns as YYYY-MM-DD, which
+    matches the dates the API returns, and columns with a time of day as
+    YYYY-MM-DD HH:MM:SS. Used wherever dates leave a frame (Sheets, the
+    snapshot store, snapshot diffs), so they all write the same text.
+
+    Args:
+        col (pd.Series): datetime64 column.
+
+    Returns:
+        pd.Series: The formatted dates; NaN where a date is missing.
+    """
+    has_time = (col.dropna() != col.dropna().dt.normalize()).any()
+    return col.dt.strftime("%Y-%m-%d %H:%M:%S" if has_time else "%Y-%m-%d")
+
+def apply_schema(entity: str, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts the known columns of a Meisterplan entity frame to compact dtypes.
+
+    Args:
+        entity (str): Entity name, e.g. "allocationSlices" (see entity_for).
+        df (pd.DataFrame): Frame built from the API items.
+
+    Returns:
+        pd.DataFrame: The frame with converted columns; unknown entities and columns are left as they are.
+    """
+    schema = SCHEMAS.get(entity)
+    if not schema or df.empty:
+        return df
+    conversions = {name: _convert(df[name], dtype) for name, dtype in schema.items() if name in df.columns}
+    return df.assign(**conversions) if conversions else df
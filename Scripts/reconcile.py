@@ -0,0 +1,193 @@
+# reconcile.py
+# Asana <-> Meisterplan reconciliation for get_AsanaTime.py.
+# Works on the rows already built for the "Asana Data" and "MP Data" tabs and
+# does the matching in pandas instead of in sheet formulas:
+#   - projects are linked when MP's cust_asana_id equals the Asana gid, or when
+#     the Asana "MP Mapping" field equals the MP project key
+#   - milestones of linked projects are joined by name, then by date
+# The result is one row per mismatch: missing links, conflicting links,
+# milestones on one side only or under different names, date drift and
+# status disagreements.
+from datetime import date
+import pandas as pd
+
+MISMATCH_HEADER = [
+    "Issue", "Asana Project", "Asana Project ID", "MP Project", "MP Project Key",
+    "Milestone", "Asana Date", "MP Date", "Drift (days)", "Asana Status", "Details"
+]
+
+# Milestone dates further apart than this are reported as drift
+DATE_DRIFT_TOLERANCE_DAYS = 0
+
+def _frame(rows: list) -> pd.DataFrame:
+    # Header + rows -> DataFrame with "N/A" / empty cells as missing
+    df = pd.DataFrame(rows[1:], columns=rows[0], dtype=object)
+    return df.mask(df.isin(["N/A", ""]))
+
+def _text_key(col: pd.Series) -> pd.Series:
+    # Case- and whitespace-insensitive join key; missing stays missing
+    return col.astype(object).where(col.isna(), col.astype(str).str.strip().str.casefold())
+
+def link_projects(asana: pd.DataFrame, mp: pd.DataFrame) -> pd.DataFrame:
+    """
+    Links Asana and Meisterplan projects.
+
+    Args:
+        asana (pd.DataFrame): One row per Asana project (Asana Project ID, Project Name, MP Mapping).
+        mp (pd.DataFrame): One row per MP project (projectKey, projectName, cust_asana_id, ...).
+
+    Returns:
+        pd.DataFrame: Outer join of both on _mp_row, with _merge ("both",
+            "left_only" for Asana only, "right_only" for MP only).
+    """
+    mp = mp.assign(_mp_row=range(len(mp)))
+    asana = asana.assign(_asana_row=range(len(asana)))
+
+    # Index MP by cust_asana_id and by project key, then look up each Asana project in both
+    by_gid = asana.merge(mp[["cust_asana_id", "_mp_row"]].dropna(), how="left", left_on="Asana Project ID", right_on="cust_asana_id")
+    mp_keys = mp[["projectKey", "_mp_row"]].assign(_key=_text_key(mp["projectKey"])).dropna(subset=["_key"])
+    by_key = asana.assign(_key=_text_key(asana["MP Mapping"])).merge(mp_keys[["_key", "_mp_row"]], how="left", on="_key")
+
+    # cust_asana_id wins over MP Mapping when both find a project
+    gid_row = by_gid.drop_duplicates("_asana_row").set_index("_asana_row")["_mp_row"]
+    key_row = by_key.drop_duplicates("_asana_row").set_index("_asana_row")["_mp_row"]
+    asana["_mp_row"] = gid_row.combine_first(key_row).reindex(asana["_asana_row"]).to_numpy()
+
+    # Each MP project is claimed by at most one Asana project (the first in portfolio order)
+    linked = asana["_mp_row"].notna() & ~asana["_mp_row"].duplicated()
+    asana.loc[asana["_mp_row"].notna() & ~linked, "_mp_row"] = None
+
+    return asana.merge(mp, how="outer", on="_mp_row", indicator=True)
+
+def match_milestones(asana: pd.DataFrame, mp: pd.DataFrame) -> pd.DataFrame:
+    """
+    Joins milestones of linked projects, first by name, then the remaining ones by date.
+
+    Args:
+        asana (pd.DataFrame): Asana milestones with _mp_row, Milestone Name, Due Date and Status.
+        mp (pd.DataFrame): MP milestones with _mp_row, milestoneName and milestoneDate.
+
+    Returns:
+        pd.DataFrame: Asana columns, MP columns, _asana_date / _mp_date and
+            _by ("name" or "date") and _merge ("both", "left_only" for Asana only,
+            "right_only" for MP only).
+    """
+    asana = asana[["_mp_row", "Milestone Name", "Due Date", "Status"]].assign(
+        _a=range(len(asana)), _name=_text_key(asana["Milestone Name"]),
+        _asana_date=pd.to_datetime(asana["Due Date"], errors="coerce")
+    )
+    mp = mp[["_mp_row", "milestoneName", "milestoneDate"]].assign(
+        _m=range(len(mp)), _name=_text_key(mp["milestoneName"]),
+        _mp_date=pd.to_datetime(mp["milestoneDate"], errors="coerce")
+    )
+
+    # Same name in the same project; repeated names are paired in order
+    asana["_n"] = asana.groupby(["_mp_row", "_name"]).cumcount()
+    mp["_n"] = mp.groupby(["_mp_row", "_name"]).cumcount()
+    by_name = asana.merge(mp, on=["_mp_row", "_name", "_n"], suffixes=("", "_mp"))
+
+    # Renamed milestones that kept their date
+    asana_rest = asana[~asana["_a"].isin(by_name["_a"])].dropna(subset=["_asana_date"])
+    mp_rest = mp[~mp["_m"].isin(by_name["_m"])].dropna(subset=["_mp_date"])
+    asana_rest = asana_rest.assign(_d=asana_rest.groupby(["_mp_row", "_asana_date"]).cumcount())
+    mp_rest = mp_rest.assign(_d=mp_rest.groupby(["_mp_row", "_mp_date"]).cumcount())
+    by_date = asana_rest.merge(mp_rest, left_on=["_mp_row", "_asana_date", "_d"], right_on=["_mp_row", "_mp_date", "_d"], suffixes=("", "_mp"))
+
+    matched = pd.concat([by_name.assign(_by="name"), by_date.assign(_by="date")], ignore_index=True).assign(_merge="both")
+    asana_only = asana[~asana["_a"].isin(matched["_a"])].assign(_merge="left_only")
+    mp_only = mp[~mp["_m"].isin(matched["_m"])].assign(_merge="right_only")
+    columns = ["_mp_row", "Milestone Name", "Due Date", "Status", "_asana_date", "milestoneName", "milestoneDate", "_mp_date", "_by", "_merge"]
+    result = pd.concat([frame.reindex(columns=columns) for frame in (matched, asana_only, mp_only)], ignore_index=True)
+    return result.assign(_asana_date=pd.to_datetime(result["_asana_date"]), _mp_date=pd.to_datetime(result["_mp_date"]))
+
+def reconcile(asana_rows: list, mp_rows: list, today: date = None) -> list:
+    """
+    Compares the Asana and Meisterplan sheet rows and lists every mismatch.
+
+    Args:
+        asana_rows (list): Header + rows from ready_asana_data_for_sheet.
+        mp_rows (list): Header + rows from ready_mp_data_for_sheet.
+        today (date): Reference date for status checks, defaults to today.
+
+    Returns:
+        list: MISMATCH_HEADER + one row per mismatch.
+    """
+    today = pd.Timestamp(today or date.today())
+    asana = _frame(asana_rows)
+    mp = _frame(mp_rows)
+    if "MP Mapping" not in asana.columns:
+        asana["MP Mapping"] = None
+
+    asana_projects = asana.drop_duplicates("Asana Project ID")[["Asana Project ID", "Project Name", "MP Mapping"]]
+    mp_projects = mp.drop_duplicates("scenarioProjectId")[["projectName", "projectKey", "projectId", "scenarioProjectId", "cust_asana_id"]]
+    projects = link_projects(asana_projects, mp_projects)
+    issues = []
+
+    def add(frame, issue, details, **columns):
+        if len(frame):
+            issues.append(pd.DataFrame({
+                "Issue": issue,
+                "Asana Project": frame.get("Project Name"),
+                "Asana Project ID": frame.get("Asana Project ID"),
+                "MP Project": frame.get("projectName"),
+                "MP Project Key": frame.get("projectKey"),
+                **columns,
+                "Details": details,
+            }, index=frame.index))
+
+    # Project links
+    asana_only = projects[projects["_merge"] == "left_only"]
+    add(asana_only[asana_only["MP Mapping"].notna()], "Missing link", "MP Mapping does not match any MP project key")
+    add(asana_only[asana_only["MP Mapping"].isna()], "Missing link", "Asana project has no MP Mapping and no MP project points to it")
+    mp_only = projects[projects["_merge"] == "right_only"]
+    add(mp_only[mp_only["cust_asana_id"].notna()], "Missing link", "cust_asana_id does not match any Asana project in the portfolio")
+    linked = projects[projects["_merge"] == "both"]
+    conflict = linked[linked["MP Mapping"].notna() & (_text_key(linked["MP Mapping"]) != _text_key(linked["projectKey"]))]
+    add(conflict, "Link conflict", "MP Mapping '" + conflict["MP Mapping"].astype(str) + "' differs from the MP project key")
+    conflict = linked[linked["cust_asana_id"].notna() & (linked["cust_asana_id"] != linked["Asana Project ID"])]
+    add(conflict, "Link conflict", "cust_asana_id '" + conflict["cust_asana_id"].astype(str) + "' points to a different Asana project")
+
+    # Milestones of linked projects
+    project_of_gid = linked.set_index("Asana Project ID")["_mp_row"]
+    asana_ms = asana[asana["Milestone Name"].notna()].assign(_mp_row=lambda df: df["Asana Project ID"].map(project_of_gid))
+    mp_rows_by_key = linked.set_index("scenarioProjectId")["_mp_row"]
+    mp_ms = mp[mp["milestoneName"].notna()].assign(_mp_row=lambda df: df["scenarioProjectId"].map(mp_rows_by_key))
+    milestones = match_milestones(asana_ms.dropna(subset=["_mp_row"]), mp_ms.dropna(subset=["_mp_row"]))
+    milestones = milestones.merge(linked.drop(columns="_merge"), how="left", on="_mp_row")
+
+    asana_date = milestones["_asana_date"].dt.strftime("%Y-%m-%d")
+    mp_date = milestones["_mp_date"].dt.strftime("%Y-%m-%d")
+    drift = (milestones["_mp_date"] - milestones["_asana_date"]).dt.days
+    name = milestones["Milestone Name"].fillna(milestones["milestoneName"])
+    both = milestones["_merge"] == "both"
+
+    only = milestones[milestones["_merge"] == "left_only"]
+    add(only, "Milestone missing in MP", "", Milestone=name, **{"Asana Date": asana_date, "Asana Status": milestones["Status"]})
+    only = milestones[milestones["_merge"] == "right_only"]
+    add(only, "Milestone missing in Asana", "", Milestone=name, **{"MP Date": mp_date})
+
+    renamed = milestones[milestones["_by"] == "date"]
+    add(renamed, "Name mismatch", "MP name: '" + renamed["milestoneName"].astype(str) + "'", Milestone=name, **{
+        "Asana Date": asana_date, "MP Date": mp_date, "Asana Status": milestones["Status"]
+    })
+
+    drifted = milestones[both & (drift.abs() > DATE_DRIFT_TOLERANCE_DAYS)]
+    add(drifted, "Date drift", "", Milestone=name, **{
+        "Asana Date": asana_date, "MP Date": mp_date, "Drift (days)": drift, "Asana Status": milestones["Status"]
+    })
+
+    completed_early = milestones[both & (milestones["Status"] == "Completed") & (milestones["_mp_date"] > today)]
+    add(completed_early, "Status disagreement", "Completed in Asana but MP plans it in the future", Milestone=name, **{
+        "Asana Date": asana_date, "MP Date": mp_date, "Asana Status": milestones["Status"]
+    })
+    overdue = milestones[both & (milestones["Status"] == "Incomplete") & (milestones["_mp_date"] < today)]
+    add(overdue, "Status disagreement", "MP date has passed but the milestone is open in Asana", Milestone=name, **{
+        "Asana Date": asana_date, "MP Date": mp_date, "Asana Status": milestones["Status"]
+    })
+
+    if not issues:
+        return [MISMATCH_HEADER]
+    result = pd.concat(issues, ignore_index=True).reindex(columns=MISMATCH_HEADER)
+    result["Drift (days)"] = result["Drift (days)"].map(lambda v: "" if pd.isna(v) else str(int(v)))
+    values = result.astype(object).where(result.notna(), "").to_numpy().tolist()
+    return [MISMATCH_HEADER] + values
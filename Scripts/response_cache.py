@@ -0,0 +1,135 @@
+# response_cache.py
+# Local SQLite cache of API responses for incremental syncs.
+# Responses are keyed by full request URL, which already encodes the endpoint,
+# scenario and date window. ETag / Last-Modified validators are replayed on the
+# next request so unchanged pages come back as 304; when the API sends no
+# validators, the body hash tells us whether the page changed.
+# Pages are saved as they are fetched, so unchanged pages alone don't prove the
+# data was published: each output records the data hash it last wrote, and a
+# run only skips the writers when every output it targets already has it.
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+class ResponseCache:
+    def __init__(self, filepath: str):
+        """
+        Opens (or creates) the cache database.
+
+        Args:
+            filepath (str): Path of the SQLite file.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        self.filepath = filepath
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(filepath, check_same_thread=False)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body_hash TEXT,
+                body BLOB,
+                fetched_at TEXT
+            )"""
+        )
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS outputs (
+                output TEXT PRIMARY KEY,
+                data_hash TEXT,
+                written_at TEXT
+            )"""
+        )
+        self.conn.commit()
+
+        # Per-run counters
+        self.changed = 0
+        self.unchanged = 0
+
+    def conditional_headers(self, url: str) -> dict:
+        # If-None-Match / If-Modified-Since headers for a previously cached URL
+        with self.lock:
+            row = self.conn.execute("SELECT etag, last_modified FROM responses WHERE url = ?", (url,)).fetchone()
+        if not row:
+            return {}
+        etag, last_modified = row
+        cond_headers = {}
+        if etag:
+            cond_headers["If-None-Match"] = etag
+        if last_modified:
+            cond_headers["If-Modified-Since"] = last_modified
+        return cond_headers
+
+    def load(self, url: str) -> bytes:
+        # Cached body for a URL the server answered with 304 Not Modified
+        with self.lock:
+            row = self.conn.execute("SELECT body FROM responses WHERE url = ?", (url,)).fetchone()
+            self.unchanged += 1
+        return row[0]
+
+    def store(self, url: str, response) -> bool:
+        """
+        Saves a 200 response and records whether its body changed since the last run.
+
+        Args:
+            url (str): Full request URL used as the cache key.
+            response (requests.Response): The successful response.
+
+        Returns:
+            bool: True if the body differs from the cached copy (or was not cached).
+        """
+        body = response.content
+        body_hash = hashlib.sha256(body).hexdigest()
+        with self.lock:
+            row = self.conn.execute("SELECT body_hash FROM responses WHERE url = ?", (url,)).fetchone()
+            changed = not row or row[0] != body_hash
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    body_hash,
+                    body,
+                    datetime.now().isoformat(timespec="seconds")
+                )
+            )
+            self.conn.commit()
+            if changed:
+                self.changed += 1
+            else:
+                self.unchanged += 1
+        return changed
+
+    def is_written(self, outputs: list, data_hash: str) -> bool:
+        """
+        Checks whether every output already holds this data.
+
+        Args:
+            outputs (list): Output names, e.g. "gsheets:PoR".
+            data_hash (str): Hash of the data about to be written.
+
+        Returns:
+            bool: True if each output's last successful write had data_hash.
+        """
+        with self.lock:
+            written = dict(self.conn.execute(
+                f"SELECT output, data_hash FROM outputs WHERE output IN ({', '.join('?' * len(outputs))})", outputs
+            ).fetchall())
+        return bool(outputs) and all(written.get(output) == data_hash for output in outputs)
+
+    def mark_written(self, outputs: list, data_hash: str):
+        # Called only after the writes succeeded
+        written_at = datetime.now().isoformat(timespec="seconds")
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?)",
+                [(output, data_hash, written_at) for output in outputs]
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,283 @@
+# run_metrics.py
+# Structured per-stage metrics for export runs.
+# A run is split into stages (fetch, build, excel, gsheets, ...). Each stage
+# records its duration, rows, HTTP pages, bytes and retries (reported by
+# api_client for every request made while the stage is active in that thread)
+# and memory: rss_delta_mb is how much the resident memory of the process grew
+# (or shrank) during the stage, and process_peak_rss_mb is the high-water mark
+# of the whole process so far, which in the daemon only ever rises. Stages
+# running at the same time (e.g. shards fetched in parallel) share one process,
+# so their deltas overlap. At the end of the run every stage is appended
+# to a JSON lines file and, optionally, written as a Prometheus textfile for the
+# node_exporter textfile collector.
+#
+# Stages are no-ops until start_run is called, so the instrumented functions
+# can still be imported and used on their own.
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_METRICS_PATH = os.path.join(BASE_DIR, "Logs", "metrics.jsonl")
+PROMETHEUS_PREFIX = "mp_export"
+
+def rss_mb() -> float:
+    # Current resident memory of the process, None where unavailable (only Linux has /proc)
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / 1e6, 1)
+
+def process_peak_rss_mb() -> float:
+    # Peak resident memory of the process since it started, None where unavailable
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / 1e6 if sys.platform == "darwin" else peak / 1e3, 1)
+
+def _delta(before: float, after: float) -> float:
+    return None if before is None or after is None else round(after - before, 1)
+
+class Stage:
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = {k: str(v) for k, v in labels.items() if v is not None}
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.duration_s = None
+        self.rows = None
+        self.pages = 0
+        self.bytes = 0
+        self.retries = 0
+        self.rss_delta_mb = None
+        self.process_peak_rss_mb = None
+        self.status = "ok"
+        self.lock = threading.Lock()
+
+    def record_request(self, num_bytes: int, retries: int):
+        with self.lock:
+            self.pages += 1
+            self.bytes += num_bytes
+            self.retries += retries
+
+    def to_dict(self) -> dict:
+        return {
+            "stage": self.name,
+            "labels": self.labels,
+            "started_at": self.started_at,
+            "duration_s": self.duration_s,
+            "rows": self.rows,
+            "pages": self.pages,
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "rss_delta_mb": self.rss_delta_mb,
+            "process_peak_rss_mb": self.process_peak_rss_mb,
+            "status": self.status,
+        }
+
+class RunMetrics:
+    def __init__(self, script: str, metrics_path: str = DEFAULT_METRICS_PATH, prometheus_path: str = None):
+        """
+        Collects the stages of one run.
+
+        Args:
+            script (str): Name of the script, stored with every record.
+            metrics_path (str): JSON lines file the stages are appended to, None to skip.
+            prometheus_path (str): Prometheus textfile to (over)write, None to skip.
+        """
+        self.script = script
+        self.metrics_path = metrics_path
+        self.prometheus_path = prometheus_path
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.start = time.perf_counter()
+        self.start_rss_mb = rss_mb()
+        self.stages = []
+        self.lock = threading.Lock()
+
+    def add(self, stage: Stage):
+        with self.lock:
+            self.stages.append(stage)
+
+    def records(self, status: str) -> list:
+        # One record per stage plus a summary record for the whole run
+        common = {"run_id": self.run_id, "script": self.script}
+        records = [{**common, **stage.to_dict()} for stage in self.stages]
+        records.append({
+            **common,
+            "stage": "run",
+            "labels": {},
+            "started_at": self.started_at,
+            "duration_s": round(time.perf_counter() - self.start, 3),
+            "rows": None,
+            "pages": sum(s.pages for s in self.stages),
+            "bytes": sum(s.bytes for s in self.stages),
+            "retries": sum(s.retries for s in self.stages),
+            "rss_delta_mb": _delta(self.start_rss_mb, rss_mb()),
+            "process_peak_rss_mb": process_peak_rss_mb(),
+            "status": status,
+        })
+        return records
+
+    def write_jsonl(self, records: list):
+        os.makedirs(os.path.dirname(os.path.abspath(self.metrics_path)), exist_ok=True)
+        with open(self.metrics_path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    def write_prometheus(self, records: list):
+        # Gauges per stage, labelled by script, stage and the stage's own labels
+        def label_text(record):
+            labels = {"script": self.script, "stage": record["stage"], **record["labels"]}
+            escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+            return ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped))
+
+        metrics = [
+            ("duration_seconds", "duration_s", "Stage wall time in seconds."),
+            ("rows", "rows", "Rows produced by the stage."),
+            ("pages", "pages", "HTTP pages fetched during the stage."),
+            ("bytes", "bytes", "HTTP response bytes received during the stage."),
+            ("retries", "retries", "HTTP retries (429/5xx) during the stage."),
+            ("rss_delta_megabytes", "rss_delta_mb", "Change in process resident memory during the stage."),
+            ("process_peak_rss_megabytes", "process_peak_rss_mb", "Peak process memory since the process started, read at the end of the stage."),
+        ]
+        lines = []
+        for metric, field, help_text in metrics:
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_stage_{metric} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_stage_{metric} gauge")
+            # Repeated stages with the same labels (e.g. one fetch per shard) are summed, memory is maxed
+            # (parallel shards overlap, so summing their deltas would count memory twice)
+            values = {}
+            for record in records:
+                if record[field] is not None:
+                    key = label_text(record)
+                    combine = max if field in ("rss_delta_mb", "process_peak_rss_mb") else (lambda a, b: a + b)
+                    values[key] = combine(values[key], record[field]) if key in values else record[field]
+            lines.extend(f"{PROMETHEUS_PREFIX}_stage_{metric}{{{key}}} {value}" for key, value in values.items())
+        run = records[-1]
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_last_run_success Whether the last run finished without errors.")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_last_run_success gauge")
+        lines.append(f'{PROMETHEUS_PREFIX}_last_run_success{{script="{self.script}"}} {1 if run["status"] == "ok" else 0}')
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_last_run_timestamp_seconds Unix time the last run finished.")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_last_run_timestamp_seconds gauge")
+        lines.append(f'{PROMETHEUS_PREFIX}_last_run_timestamp_seconds{{script="{self.script}"}} {time.time():.0f}')
+
+        # Write then rename so the collector never reads a half-written file
+        os.makedirs(os.path.dirname(os.path.abspath(self.prometheus_path)), exist_ok=True)
+        tmp_path = f"{self.prometheus_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prometheus_path)
+
+    def finish(self, status: str = "ok") -> list:
+        """
+        Writes the collected stages.
+
+        Args:
+            status (str): "ok" or "error" for the run as a whole.
+
+        Returns:
+            list: The records written.
+        """
+        records = self.records(status)
+        if self.metrics_path:
+            self.write_jsonl(records)
+        if self.prometheus_path:
+            self.write_prometheus(records)
+        return records
+
+_run = None
+_local = threading.local()
+
+def start_run(script: str, metrics_path: str = DEFAULT_METRICS_PATH, prometheus_path: str = None) -> RunMetrics:
+    # Starts collecting stages for this process
+    global _run
+    _run = RunMetrics(script, metrics_path, prometheus_path)
+    return _run
+
+def finish_run(status: str = "ok") -> list:
+    # Writes the current run's stages and stops collecting
+    global _run
+    if _run is None:
+        return []
+    run, _run = _run, None
+    records = run.finish(status)
+    if run.metrics_path:
+        print(f"Run metrics ({records[-1]['duration_s']}s, {len(records) - 1} stages) appended to {run.metrics_path}")
+    return records
+
+def _stack() -> list:
+    if not hasattr(_local, "stages"):
+        _local.stages = []
+    return _local.stages
+
+@contextmanager
+def stage(name: str, **labels):
+    """
+    Times a block as one stage of the current run. Set stage.rows inside the block.
+
+    Args:
+        name (str): Stage name, e.g. "fetch" or "gsheets".
+        **labels: Extra dimensions, e.g. tab="Projects"; None values are dropped.
+
+    Yields:
+        Stage: The stage being recorded.
+    """
+    current = Stage(name, labels)
+    run = _run
+    start = time.perf_counter()
+    start_rss = rss_mb()
+    _stack().append(current)
+    try:
+        yield current
+    except BaseException:
+        current.status = "error"
+        raise
+    finally:
+        _stack().pop()
+        current.duration_s = round(time.perf_counter() - start, 3)
+        current.rss_delta_mb = _delta(start_rss, rss_mb())
+        current.process_peak_rss_mb = process_peak_rss_mb()
+        if run is not None:
+            run.add(current)
+
+def wrap(func):
+    """
+    Makes func count its requests towards the caller's current stage when it runs in a worker thread.
+
+    Args:
+        func: Callable submitted to a thread pool.
+
+    Returns:
+        Callable with the same signature.
+    """
+    stages = list(_stack())
+
+    def wrapped(*args, **kwargs):
+        previous = _stack()
+        _local.stages = list(stages)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.stages = previous
+    return wrapped
+
+def record_request(response):
+    # Called by api_client for every response; attributed to the innermost stage of this thread
+    stages = _stack()
+    if not stages:
+        return
+    retries = getattr(getattr(response, "raw", None), "retries", None)
+    stages[-1].record_request(len(response.content), len(retries.history) if retries else 0)
@@ -0,0 +1,241 @@
+# sheets_writer.py
+# Diff-based Google Sheets writer shared by the export scripts.
+# Instead of clearing a tab and re-uploading every cell, the current tab is
+# read once, compared row by row with the new values, and only the changed
+# row ranges are sent in a single batch_update. The tab is never blank mid-write.
+# Tabs too large to diff go through bulk_upload, which pre-sizes the grid and
+# streams rows in chunks paced against the Sheets per-minute write quota.
+# Both paths write native values (USER_ENTERED, see frame_to_values): numbers and
+# booleans stay numbers and booleans, dates become dates and text is quoted so
+# Sheets keeps it as text. The diff reads the tab back unformatted, so a tab's
+# cells neither change type nor get rewritten when it grows past BULK_UPLOAD_MIN_ROWS.
+# pandas and NumPy are imported by frame_to_values only, so text-only callers
+# (the Asana sync) don't pay for them.
+import math
+import threading
+import time
+
+# Sheets allows 60 write requests per minute per user
+WRITE_QUOTA_PER_MINUTE = 60
+DEFAULT_CHUNK_ROWS = 5000
+# Tabs with at least this many rows are bulk uploaded instead of diffed
+BULK_UPLOAD_MIN_ROWS = 50000
+
+class WritePacer:
+    # Spaces out write requests so all tabs together stay under the per-minute quota
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / per_minute
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+_pacer = WritePacer(WRITE_QUOTA_PER_MINUTE)
+
+def _native(value):
+    # One object-column value as a Sheets cell: numbers and booleans as-is, text quoted
+    if value is None or (isinstance(value, float) and not math.isfinite(value)):
+        return ""
+    if isinstance(value, (bool, int, float)):
+        return value
+    return "'" + str(value)
+
+def frame_to_values(df) -> list:
+    """
+    Converts a DataFrame to rows for a USER_ENTERED write that keeps native types:
+    numbers and booleans stay numbers and booleans, datetime columns become date
+    strings Sheets parses into dates, and all other values are forced to text
+    with a leading apostrophe. Missing values are empty strings.
+
+    Args:
+        df (pd.DataFrame): Frame to convert.
+
+    Returns:
+        list: Header + rows.
+    """
+    import numpy as np
+    import pandas as pd
+    from mp_schema import format_dates
+    columns = {}
+    for name in df.columns:
+        col = df[name]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            converted = format_dates(col).astype(object)
+        elif pd.api.types.is_bool_dtype(col) or pd.api.types.is_numeric_dtype(col):
+            if col.dtype == "float32":
+                # Shortest float32 repr, so 0.041667 isn't sent as 0.04166699945926666
+                col = col.astype(str).astype(float)
+            converted = col.astype(object)
+            if pd.api.types.is_float_dtype(col):
+                converted = converted.where(np.isfinite(col.to_numpy(dtype=float, na_value=np.nan)), None)
+        elif pd.api.types.is_object_dtype(col):
+            columns[name] = col.where(col.notna(), None).map(_native)
+            continue
+        else:
+            converted = "'" + col.astype(str)
+        columns[name] = converted.where(col.notna() & converted.notna(), "")
+    values = pd.DataFrame(columns, index=df.index).values.tolist() if columns else [[] for _ in range(len(df))]
+    return [["'" + str(name) for name in df.columns]] + values
+
+def text_values(rows: list) -> list:
+    """
+    Quotes every value of plain rows as text, for tabs that are text only
+    (e.g. the Asana sync's IDs and keys, which must not turn into numbers).
+
+    Args:
+        rows (list): Rows of values, header included; None becomes an empty cell.
+
+    Returns:
+        list: The rows as USER_ENTERED text cells.
+    """
+    return [["" if v is None else "'" + str(v) for v in row] for row in rows]
+
+def _sent(value):
+    # A written cell as Sheets returns it unformatted: quotes dropped, numbers as floats
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value[1:] if value.startswith("'") else value
+    return _stored(value)
+
+def _stored(value):
+    # A cell read back with UNFORMATTED_VALUE; ints and floats compare by value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+def diff_ranges(current: list, values: list) -> list:
+    """
+    Compares the current tab contents with new values row by row.
+
+    Args:
+        current (list): Rows as returned by worksheet.get_all_values() with
+            UNFORMATTED_VALUE and FORMATTED_STRING dates.
+        values (list): New rows in frame_to_values form, header included.
+
+    Returns:
+        list: (first_row, last_row) 1-based, inclusive ranges of consecutive changed rows.
+    """
+    ranges = []
+    start = None
+    for i, row in enumerate(values):
+        old = current[i] if i < len(current) else []
+        width = max(len(row), len(old))
+        new_row = [_sent(v) for v in row] + [""] * (width - len(row))
+        old_row = [_stored(v) for v in old] + [""] * (width - len(old))
+        if new_row != old_row:
+            if start is None:
+                start = i
+        elif start is not None:
+            ranges.append((start + 1, i))
+            start = None
+    if start is not None:
+        ranges.append((start + 1, len(values)))
+    return ranges
+
+def write_tab_diff(worksheet, values: list) -> int:
+    """
+    Writes values to a worksheet, sending only the rows that changed.
+
+    Args:
+        worksheet (gspread.Worksheet): Target tab.
+        values (list): New rows in frame_to_values or text_values form, header included.
+
+    Returns:
+        int: Number of rows written.
+    """
+    from gspread.utils import rowcol_to_a1, DateTimeOption, ValueInputOption, ValueRenderOption
+    current = worksheet.get_all_values(
+        value_render_option=ValueRenderOption.unformatted,
+        date_time_render_option=DateTimeOption.formatted_string
+    )
+    width = max([len(row) for row in values] + [len(row) for row in current] + [1])
+
+    # Grow the grid once up front; never shrink it so references from other tabs survive
+    if worksheet.row_count < len(values) or worksheet.col_count < width:
+        _pacer.wait()
+        worksheet.resize(rows=max(worksheet.row_count, len(values)), cols=max(worksheet.col_count, width))
+
+    data = []
+    for first, last in diff_ranges(current, values):
+        rows = [["" if v is None else v for v in row] + [""] * (width - len(row)) for row in values[first - 1:last]]
+        data.append({"range": f"{rowcol_to_a1(first, 1)}:{rowcol_to_a1(last, width)}", "values": rows})
+    if data:
+        _pacer.wait()
+        worksheet.batch_update(data, value_input_option=ValueInputOption.user_entered)
+
+    # Clear rows left over from a longer previous write
+    if len(current) > len(values):
+        _pacer.wait()
+        worksheet.batch_clear([f"{rowcol_to_a1(len(values) + 1, 1)}:{rowcol_to_a1(len(current), width)}"])
+
+    written = sum(len(d["values"]) for d in data)
+    print(f"  '{worksheet.title}': {written} of {len(values)} rows changed")
+    return written
+
+def bulk_upload(worksheet, values: list, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> int:
+    """
+    Uploads a large tab in chunks: the grid is sized once, rows are sent
+    chunk_rows at a time as native USER_ENTERED values (like write_tab_diff),
+    and every request is paced against the write quota.
+
+    Args:
+        worksheet (gspread.Worksheet): Target tab.
+        values (list): New rows in frame_to_values form, header included.
+        chunk_rows (int): Rows per update request.
+
+    Returns:
+        int: Number of rows written.
+    """
+    from gspread.utils import rowcol_to_a1, ValueInputOption
+    width = max([len(row) for row in values] + [1])
+    old_rows = worksheet.row_count
+
+    # Size the grid once: enough rows and columns for the new data
+    if worksheet.row_count < len(values) or worksheet.col_count < width:
+        _pacer.wait()
+        worksheet.resize(rows=max(worksheet.row_count, len(values)), cols=max(worksheet.col_count, width))
+
+    for start in range(0, len(values), chunk_rows):
+        chunk = values[start:start + chunk_rows]
+        _pacer.wait()
+        worksheet.update(
+            chunk,
+            f"{rowcol_to_a1(start + 1, 1)}:{rowcol_to_a1(start + len(chunk), width)}",
+            value_input_option=ValueInputOption.user_entered
+        )
+        print(f"  '{worksheet.title}': {start + len(chunk)} of {len(values)} rows uploaded")
+
+    # Clear rows and columns left over from a larger previous write
+    stale_ranges = []
+    if old_rows > len(values):
+        stale_ranges.append(f"{rowcol_to_a1(len(values) + 1, 1)}:{rowcol_to_a1(old_rows, worksheet.col_count)}")
+    if worksheet.col_count > width:
+        stale_ranges.append(f"{rowcol_to_a1(1, width + 1)}:{rowcol_to_a1(len(values), worksheet.col_count)}")
+    if stale_ranges:
+        _pacer.wait()
+        worksheet.batch_clear(stale_ranges)
+
+    return len(values)
+
+def write_frame(worksheet, df, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> int:
+    """
+    Writes a DataFrame to a tab, diffing small tabs and bulk uploading large ones.
+
+    Args:
+        worksheet (gspread.Worksheet): Target tab.
+        df (pd.DataFrame): Data to write.
+        chunk_rows (int): Rows per request for bulk uploads.
+
+    Returns:
+        int: Number of rows written.
+    """
+    if len(df) >= BULK_UPLOAD_MIN_ROWS:
+        return bulk_upload(worksheet, frame_to_values(df), chunk_rows)
+    return write_tab_diff(worksheet, frame_to_values(df))
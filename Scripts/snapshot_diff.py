@@ -0,0 +1,231 @@
+# snapshot_diff.py
+# Keyed diff between two Meisterplan exports.
+# A snapshot can be an Excel export from Data/, a directory of Parquet/CSV
+# files (--output-mode parquet/csv), or a run stored in the snapshot history
+# ("store:<snapshot_id>"). Rows are matched per tab on the keys in ENTITY_KEYS
+# and compared by hashing their remaining columns, so even full allocation
+# tables diff in seconds.
+#
+# Usage:
+#   python Scripts/snapshot_diff.py Data/old.xlsx Data/new.xlsx
+#   python Scripts/snapshot_diff.py store:41 store:42 --limit 10 --output changes.md
+import argparse
+import glob
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from mp_schema import format_dates
+from snapshot_store import DEFAULT_STORE_PATH, SnapshotStore
+
+# Tab -> columns identifying a row. Allocations are keyed by project + resource + role + month.
+# Tabs without their key columns fall back to comparing whole rows (added/removed only).
+ENTITY_KEYS = {
+    "Projects": ["projectId"],
+    "Allocations": ["scenarioProjectId", "resourceId", "allocationProjectRoleId", "allocationStart"],
+    "Milestones": ["milestoneId"],
+    "Resources": ["resourceId"],
+    "Financials": ["scenarioProjectId", "financialsDate", "financeCategoryName"],
+    # Tab name used by older exports
+    "FinancialEvents": ["scenarioProjectId", "financialsDate", "financeCategoryName"],
+}
+
+DEFAULT_LIMIT = 20
+
+def load_snapshot(source: str, store_path: str = DEFAULT_STORE_PATH) -> dict:
+    """
+    Loads every tab of a snapshot.
+
+    Args:
+        source (str): Path to an .xlsx export, a directory of .parquet/.csv files,
+            or "store:<snapshot_id>" for a run in the snapshot history.
+        store_path (str): SQLite file used for "store:" sources.
+
+    Returns:
+        dict: Tab names mapped to DataFrames.
+    """
+    if source.startswith("store:"):
+        snapshot_id = int(source.split(":", 1)[1])
+        store = SnapshotStore(store_path)
+        try:
+            tables = [row[0] for row in store.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT IN ('snapshots', 'sqlite_sequence')"
+            )]
+            return {table: store.load(table, snapshot_id) for table in tables}
+        finally:
+            store.close()
+
+    if os.path.isdir(source):
+        dataframes = {}
+        for filepath in sorted(glob.glob(os.path.join(source, "*.parquet")) + glob.glob(os.path.join(source, "*.csv"))):
+            name = os.path.splitext(os.path.basename(filepath))[0]
+            if filepath.endswith(".parquet"):
+                dataframes[name] = pd.read_parquet(filepath)
+            else:
+                dataframes[name] = pd.read_csv(filepath, dtype=str, keep_default_na=False)
+        return dataframes
+
+    return pd.read_excel(source, sheet_name=None)
+
+def _number_text(numbers: np.ndarray) -> np.ndarray:
+    # 2, 2.0 and "2" all become "2"; NaN becomes ""
+    codes, uniques = pd.factorize(numbers)
+    whole = np.isfinite(uniques) & (uniques == np.round(uniques))
+    text = np.where(whole, np.where(whole, uniques, 0).astype("int64").astype(str), uniques.astype(str)).astype(object)
+    return np.append(text, "")[codes]
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    # Every column in a comparable form, whatever the source format: numeric
+    # columns (numbers or numeric text) as float64, everything else as text with
+    # date-only datetimes as YYYY-MM-DD and missing values as "".
+    # Only the distinct values of each column are converted, then expanded back.
+    columns = {}
+    for name in df.columns:
+        col = df[name]
+        if pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+            columns[str(name)] = col.to_numpy(dtype="float64", na_value=np.nan)
+            continue
+        if pd.api.types.is_datetime64_any_dtype(col):
+            col = format_dates(col)
+        codes, uniques = pd.factorize(col.astype(object))
+        uniques = np.asarray(uniques, dtype=object)
+        text = uniques.astype(str).astype(object)
+        if not pd.api.types.is_bool_dtype(col) and len(uniques):
+            numbers = pd.to_numeric(pd.Series(uniques, dtype=object), errors="coerce").to_numpy(dtype="float64")
+            if not np.isnan(numbers[text != ""]).any():
+                columns[str(name)] = np.append(numbers, np.nan)[codes]
+                continue
+        columns[str(name)] = np.append(text, "")[codes]
+    return pd.DataFrame(columns, index=df.index)
+
+def _as_text(df: pd.DataFrame, names: list) -> pd.DataFrame:
+    # Numeric columns among names converted to text
+    numeric = [n for n in names if pd.api.types.is_float_dtype(df[n])]
+    return df.assign(**{n: _number_text(df[n].to_numpy()) for n in numeric}) if numeric else df
+
+def _keyed(df: pd.DataFrame, keys: list, value_cols: list) -> pd.DataFrame:
+    # Frame indexed by key (+ occurrence number for repeated keys) with a hash of the value columns
+    frame = df[keys].copy()
+    frame["_occurrence"] = df.groupby(keys, sort=False).cumcount()
+    frame["_hash"] = pd.util.hash_pandas_object(df[value_cols], index=False).to_numpy() if value_cols else 0
+    frame["_row"] = range(len(df))
+    return frame
+
+def diff_frames(old: pd.DataFrame, new: pd.DataFrame, keys: list = None) -> dict:
+    """
+    Computes added, removed and changed rows between two versions of a tab.
+
+    Args:
+        old (pd.DataFrame): Earlier version.
+        new (pd.DataFrame): Later version.
+        keys (list): Key columns; whole rows are compared when missing from either frame.
+
+    Returns:
+        dict: "added" and "removed" DataFrames, "changed" DataFrame (key columns plus
+            column / old / new for every changed cell), and "keys" actually used.
+    """
+    old = _normalize(old)
+    new = _normalize(new)
+    columns = list(dict.fromkeys(list(old.columns) + list(new.columns)))
+    if not keys or not all(k in old.columns and k in new.columns for k in keys):
+        keys = columns
+    value_cols = [c for c in columns if c not in keys]
+
+    # Keys, and columns that are numeric on one side only, are compared as text
+    mixed = [c for c in columns if c in keys or c not in old.columns or c not in new.columns
+             or pd.api.types.is_float_dtype(old[c]) != pd.api.types.is_float_dtype(new[c])]
+    old = _as_text(old.reindex(columns=columns, fill_value=""), mixed)
+    new = _as_text(new.reindex(columns=columns, fill_value=""), mixed)
+
+    merged = _keyed(old, keys, value_cols).merge(
+        _keyed(new, keys, value_cols),
+        how="outer",
+        on=keys + ["_occurrence"],
+        suffixes=("_old", "_new"),
+        indicator=True
+    )
+    removed = old.iloc[merged.loc[merged["_merge"] == "left_only", "_row_old"].astype(int)]
+    added = new.iloc[merged.loc[merged["_merge"] == "right_only", "_row_new"].astype(int)]
+
+    both = merged[(merged["_merge"] == "both") & (merged["_hash_old"] != merged["_hash_new"])]
+    old_rows = old.iloc[both["_row_old"].astype(int)].reset_index(drop=True)
+    new_rows = new.iloc[both["_row_new"].astype(int)].reset_index(drop=True)
+
+    # One line per changed cell
+    changes = []
+    for name in value_cols:
+        mask = (old_rows[name] != new_rows[name]) & ~(old_rows[name].isna() & new_rows[name].isna())
+        if mask.any():
+            part = new_rows.loc[mask, keys].copy()
+            part["column"] = name
+            part["old"] = old_rows.loc[mask, name].to_numpy()
+            part["new"] = new_rows.loc[mask, name].to_numpy()
+            if pd.api.types.is_float_dtype(old_rows[name]):
+                part["old"] = _number_text(part["old"].to_numpy())
+                part["new"] = _number_text(part["new"].to_numpy())
+            changes.append(part)
+    changed = pd.concat(changes, ignore_index=True) if changes else pd.DataFrame(columns=keys + ["column", "old", "new"])
+
+    return {"added": added, "removed": removed, "changed": changed, "changed_rows": len(both), "keys": keys}
+
+def diff_snapshots(old: dict, new: dict) -> dict:
+    # diff_frames for every tab present in either snapshot
+    results = {}
+    for name in dict.fromkeys(list(old) + list(new)):
+        results[name] = diff_frames(old.get(name, pd.DataFrame()), new.get(name, pd.DataFrame()), ENTITY_KEYS.get(name))
+    return results
+
+def format_report(results: dict, old_label: str, new_label: str, limit: int = DEFAULT_LIMIT) -> str:
+    """
+    Renders diff results as a compact Markdown change report.
+
+    Args:
+        results (dict): Output of diff_snapshots.
+        old_label (str): Name of the earlier snapshot.
+        new_label (str): Name of the later snapshot.
+        limit (int): Maximum example rows per section.
+
+    Returns:
+        str: The report.
+    """
+    lines = [f"## Meisterplan changes: {old_label} -> {new_label}", ""]
+    lines.append("| Tab | Added | Removed | Changed rows |")
+    lines.append("| --- | ---: | ---: | ---: |")
+    for name, result in results.items():
+        lines.append(f"| {name} | {len(result['added'])} | {len(result['removed'])} | {result['changed_rows']} |")
+
+    for name, result in results.items():
+        keys = result["keys"]
+        for section in ("added", "removed"):
+            frame = result[section]
+            if len(frame):
+                lines += ["", f"### {name}: {section} ({len(frame)})", "```", frame[keys].head(limit).to_string(index=False), "```"]
+        if len(result["changed"]):
+            lines += ["", f"### {name}: changed cells ({len(result['changed'])})", "```", result["changed"].head(limit).to_string(index=False), "```"]
+    return "\n".join(lines) + "\n"
+
+def cli(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Show what changed between two Meisterplan exports.")
+    parser.add_argument("old", help="Earlier snapshot: .xlsx file, Parquet/CSV directory or store:<snapshot_id>.")
+    parser.add_argument("new", help="Later snapshot, same forms as old.")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Snapshot history for store: sources (default: Data/snapshots.sqlite).")
+    parser.add_argument("-n", "--limit", type=int, default=DEFAULT_LIMIT, help=f"Example rows per section (default: {DEFAULT_LIMIT}).")
+    parser.add_argument("-o", "--output", help="Also write the report to this file.")
+    args = parser.parse_args(argv)
+
+    try:
+        old_snapshot = load_snapshot(args.old, args.store)
+        new_snapshot = load_snapshot(args.new, args.store)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"Could not load snapshot: {e}")
+        exit(1)
+
+    report = format_report(diff_snapshots(old_snapshot, new_snapshot), args.old, args.new, args.limit)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+        print(f"Report written to {args.output}")
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,207 @@
+# snapshot_store.py
+# Local SQLite warehouse of every export.
+# Each run of get_allMPdata.py appends its frames tagged with a snapshot ID,
+# timestamp and scenario, so history can be queried without reopening the
+# timestamped workbooks in Data/. One table per tab (Projects, Allocations, ...),
+# indexed by project (scenarioProjectId, projectId), resource and month
+# (allocationStart for MONTH allocations, financialsDate for financials).
+#
+# Usage:
+#   python Scripts/snapshot_store.py list
+#   python Scripts/snapshot_store.py history Allocations --filter scenarioProjectId=<id> --last 30
+#   python Scripts/snapshot_store.py sql "SELECT COUNT(*) FROM Allocations"
+import argparse
+import json
+import os
+import sqlite3
+from datetime import datetime
+import pandas as pd
+from mp_schema import format_dates
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_STORE_PATH = os.path.join(BASE_DIR, "Data", "snapshots.sqlite")
+
+# Columns indexed (together with snapshot_id) whenever a tab has them
+INDEX_COLUMNS = ["scenarioProjectId", "projectId", "resourceId", "allocationStart", "financialsDate"]
+
+def _quote(name: str) -> str:
+    # SQLite identifier quoting
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+    # SQLite-friendly copy: nested objects as JSON text, categoricals as plain values, dates as ISO text
+    columns = {}
+    for name in df.columns:
+        col = df[name]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            col = col.astype(object)
+        if pd.api.types.is_datetime64_any_dtype(col):
+            # Date-only columns match the YYYY-MM-DD strings the API returns
+            col = format_dates(col).where(col.notna(), None)
+        elif col.dtype == object:
+            col = col.map(lambda v: json.dumps(v) if isinstance(v, (dict, list)) else v)
+        columns[str(name)] = col
+    return pd.DataFrame(columns, index=df.index)
+
+class SnapshotStore:
+    def __init__(self, filepath: str = DEFAULT_STORE_PATH):
+        """
+        Opens (or creates) the snapshot database.
+
+        Args:
+            filepath (str): Path of the SQLite file.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        self.filepath = filepath
+        self.conn = sqlite3.connect(filepath)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS snapshots (
+                snapshot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                taken_at TEXT NOT NULL,
+                scenario TEXT NOT NULL,
+                scenario_id TEXT
+            )"""
+        )
+        self.conn.commit()
+
+    def _columns(self, table: str) -> list:
+        return [row[1] for row in self.conn.execute(f"PRAGMA table_info({_quote(table)})")]
+
+    def append(self, scenario: str, dataframes: dict, scenario_id: str = None, taken_at: str = None) -> int:
+        """
+        Appends one export as a new snapshot.
+
+        Args:
+            scenario (str): Scenario label (e.g. "PoR" or a .env alias).
+            dataframes (dict): Dictionary where keys are tab names and values are DataFrames.
+            scenario_id (str): Meisterplan scenario ID, None for the Plan of Record.
+            taken_at (str): Snapshot timestamp, defaults to now.
+
+        Returns:
+            int: The new snapshot ID.
+        """
+        taken_at = taken_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO snapshots (taken_at, scenario, scenario_id) VALUES (?, ?, ?)",
+                (taken_at, scenario, scenario_id)
+            )
+            snapshot_id = cursor.lastrowid
+
+            for table, df in dataframes.items():
+                if df.empty:
+                    continue
+                frame = _prepare(df)
+                frame.insert(0, "snapshot_id", snapshot_id)
+
+                # New API fields become new columns instead of failing the append
+                existing = self._columns(table)
+                if existing:
+                    for name in frame.columns:
+                        if name not in existing:
+                            self.conn.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(name)}")
+                frame.to_sql(table, self.conn, if_exists="append", index=False, chunksize=10000)
+
+                self.conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_quote(f'idx_{table}_snapshot')} ON {_quote(table)} (snapshot_id)"
+                )
+                for name in INDEX_COLUMNS:
+                    if name in frame.columns:
+                        self.conn.execute(
+                            f"CREATE INDEX IF NOT EXISTS {_quote(f'idx_{table}_{name}')} ON {_quote(table)} ({_quote(name)}, snapshot_id)"
+                        )
+        return snapshot_id
+
+    def snapshots(self, scenario: str = None) -> pd.DataFrame:
+        # All snapshots, newest first
+        query = "SELECT * FROM snapshots"
+        params = []
+        if scenario:
+            query += " WHERE scenario = ?"
+            params.append(scenario)
+        return pd.read_sql_query(query + " ORDER BY snapshot_id DESC", self.conn, params=params)
+
+    def load(self, table: str, snapshot_id: int) -> pd.DataFrame:
+        # One tab as it was in one snapshot
+        frame = pd.read_sql_query(f"SELECT * FROM {_quote(table)} WHERE snapshot_id = ?", self.conn, params=[snapshot_id])
+        return frame.drop(columns="snapshot_id")
+
+    def history(self, table: str, filters: dict = None, scenario: str = None, last: int = 30) -> pd.DataFrame:
+        """
+        Returns the rows of a tab across the most recent snapshots.
+
+        Args:
+            table (str): Tab name, e.g. "Allocations".
+            filters (dict): Column equality filters, e.g. {"projectId": "P-123"}.
+            scenario (str): Only snapshots of this scenario label.
+            last (int): Number of most recent snapshots to include.
+
+        Returns:
+            pd.DataFrame: Matching rows with taken_at and scenario, oldest snapshot first.
+        """
+        columns = self._columns(table)
+        if not columns:
+            raise ValueError(f"No snapshots stored for '{table}'")
+
+        snapshot_query = "SELECT snapshot_id FROM snapshots"
+        params = []
+        if scenario:
+            snapshot_query += " WHERE scenario = ?"
+            params.append(scenario)
+        snapshot_query += " ORDER BY snapshot_id DESC LIMIT ?"
+        params.append(last)
+
+        where = [f"t.snapshot_id IN ({snapshot_query})"]
+        for name, value in (filters or {}).items():
+            if name not in columns:
+                raise ValueError(f"Unknown column '{name}' in '{table}'")
+            where.append(f"t.{_quote(name)} = ?")
+            params.append(value)
+
+        query = (
+            f"SELECT s.taken_at, s.scenario, t.* FROM {_quote(table)} t "
+            f"JOIN snapshots s ON s.snapshot_id = t.snapshot_id "
+            f"WHERE {' AND '.join(where)} ORDER BY t.snapshot_id"
+        )
+        return pd.read_sql_query(query, self.conn, params=params)
+
+    def sql(self, query: str, params: list = None) -> pd.DataFrame:
+        # Free-form read query against the store
+        return pd.read_sql_query(query, self.conn, params=params or [])
+
+    def close(self):
+        self.conn.close()
+
+def cli(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Query the local snapshot history of Meisterplan exports.")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="SQLite file (default: Data/snapshots.sqlite).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="List stored snapshots.")
+    list_parser.add_argument("-s", "--scenario", help="Only this scenario label.")
+
+    history_parser = subparsers.add_parser("history", help="Show a tab's rows across recent snapshots.")
+    history_parser.add_argument("table", help="Tab name, e.g. Allocations.")
+    history_parser.add_argument("-f", "--filter", action="append", default=[], help="column=value filter, repeatable.")
+    history_parser.add_argument("-s", "--scenario", help="Only this scenario label.")
+    history_parser.add_argument("-n", "--last", type=int, default=30, help="Number of recent snapshots (default: 30).")
+
+    sql_parser = subparsers.add_parser("sql", help="Run a read query.")
+    sql_parser.add_argument("query")
+
+    args = parser.parse_args(argv)
+    store = SnapshotStore(args.store)
+    try:
+        if args.command == "list":
+            result = store.snapshots(args.scenario)
+        elif args.command == "history":
+            filters = dict(f.split("=", 1) for f in args.filter)
+            result = store.history(args.table, filters, args.scenario, args.last)
+        else:
+            result = store.sql(args.query)
+        print(result.to_string(index=False))
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,182 @@
+# utilisation.py
+# Monthly demand vs capacity per resource and per team, computed once per export
+# instead of with pivot formulas in the sheets.
+# Allocations are fetched with aggregation=MONTH, so every slice belongs to the
+# month of its allocationStart. Demand is the summed allocationFte (and
+# allocationHours) per named resource and month; ROLE rows are unstaffed demand
+# and are left out. Capacity comes from the Resources tab (a numeric
+# CAPACITY_COLUMNS value when the API provides one, DEFAULT_CAPACITY_FTE
+# otherwise), limited to the resource's start/finish dates. Everything is laid out as resource x month
+# matrices, so sums, flags and rolling windows are plain NumPy operations.
+import numpy as np
+import pandas as pd
+
+RESOURCE_TAB = "Resource Utilisation"
+TEAM_TAB = "Team Utilisation"
+
+# FTE a resource can take on per month when the Resources tab has no capacity value
+DEFAULT_CAPACITY_FTE = 1.0
+# Resources tab columns checked, in order, for a per-resource capacity in FTE
+CAPACITY_COLUMNS = ["capacityFte", "capacity"]
+# Demand above capacity * threshold is flagged as over-allocated
+OVERALLOCATION_THRESHOLD = 1.0
+# Trailing window for the rolling totals, in months
+ROLLING_MONTHS = 3
+NO_TEAM = "(no team)"
+# Allocations tab columns (allocationSlices payload fields)
+ALLOCATION_START = "allocationStart"
+ALLOCATION_FTE = "allocationFte"
+ALLOCATION_HOURS = "allocationHours"
+
+def _month_index(dates: pd.Series) -> np.ndarray:
+    # Months since year 0 as floats, NaN where the date is missing or invalid
+    dates = pd.to_datetime(dates, errors="coerce", format="ISO8601")
+    return (dates.dt.year * 12 + dates.dt.month - 1).to_numpy(dtype=float, na_value=np.nan)
+
+def _numbers(df: pd.DataFrame, column: str) -> np.ndarray:
+    if column not in df.columns:
+        return np.zeros(len(df))
+    return pd.to_numeric(df[column], errors="coerce").fillna(0).to_numpy(dtype=float)
+
+def _rolling(matrix: np.ndarray, window: int) -> np.ndarray:
+    # Trailing sum over the last window months (fewer at the start of the range)
+    totals = np.cumsum(np.nan_to_num(matrix), axis=1)
+    totals[:, window:] -= totals[:, :-window].copy()
+    return totals
+
+def _ratio(demand: np.ndarray, capacity: np.ndarray) -> np.ndarray:
+    # Demand / capacity, NaN where there is no capacity to compare against
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(capacity > 0, demand / capacity, np.nan)
+
+def _over(demand: np.ndarray, capacity: np.ndarray, threshold: float) -> np.ndarray:
+    # Unknown capacity never flags; zero capacity flags any demand
+    return demand > np.where(np.isnan(capacity), np.inf, capacity) * threshold + 1e-9
+
+def _month_labels(months: np.ndarray) -> list:
+    return [f"{m // 12}-{m % 12 + 1:02d}" for m in months.astype(int)]
+
+def _long(keys: dict, labels: list, columns: dict) -> pd.DataFrame:
+    # Row x month matrices -> one row per row key and month
+    rows, width = next(iter(columns.values())).shape
+    frame = {name: np.repeat(np.asarray(values, dtype=object), width) for name, values in keys.items()}
+    frame["month"] = np.tile(np.asarray(labels, dtype=object), rows)
+    for name, matrix in columns.items():
+        frame[name] = matrix.ravel()
+    return pd.DataFrame(frame)
+
+def _metrics(demand: np.ndarray, hours: np.ndarray, capacity: np.ndarray, threshold: float, window: int) -> dict:
+    rolling_demand = _rolling(demand, window)
+    rolling_capacity = np.where(np.isnan(capacity).all(axis=1, keepdims=True), np.nan, _rolling(capacity, window))
+    columns = {
+        "demandFte": demand.round(3),
+        "capacityFte": capacity.round(3),
+        "utilisation": _ratio(demand, capacity).round(3),
+        "overAllocated": _over(demand, capacity, threshold),
+        f"demandFte{window}m": rolling_demand.round(3),
+        f"capacityFte{window}m": rolling_capacity.round(3),
+        f"utilisation{window}m": _ratio(rolling_demand, rolling_capacity).round(3),
+    }
+    if hours is not None:
+        columns = {"demandHours": hours.round(2), **columns}
+    return columns
+
+def utilisation_tabs(allocations: pd.DataFrame, resources: pd.DataFrame, capacity_fte: float = DEFAULT_CAPACITY_FTE,
+                     threshold: float = OVERALLOCATION_THRESHOLD, window: int = ROLLING_MONTHS) -> dict:
+    """
+    Builds the per-resource and per-team monthly demand vs capacity tabs.
+
+    Args:
+        allocations (pd.DataFrame): Allocations tab (MONTH-aggregated allocationSlices).
+        resources (pd.DataFrame): Resources tab.
+        capacity_fte (float): Monthly capacity of a resource without a capacity value.
+        threshold (float): Utilisation above which a month is flagged as over-allocated.
+        window (int): Months in the rolling totals.
+
+    Returns:
+        dict: RESOURCE_TAB and TEAM_TAB mapped to DataFrames; empty when there is nothing to compute.
+    """
+    if allocations is None or allocations.empty:
+        return {}
+    missing = [c for c in ("resourceId", ALLOCATION_START, ALLOCATION_FTE) if c not in allocations.columns]
+    if missing:
+        print(f"Warning: Allocations has no {', '.join(missing)} column(s), skipping the utilisation tabs")
+        return {}
+    if resources is None or "resourceId" not in resources.columns:
+        print("Warning: no Resources tab with resourceId, utilisation is computed without capacity")
+        resources = pd.DataFrame(columns=["resourceId"])
+
+    # Role demand without a named resource has no capacity to compare against
+    named = allocations["resourceId"].notna()
+    if "resourceType" in allocations.columns:
+        named &= (allocations["resourceType"] != "ROLE").to_numpy()
+    allocations = allocations[named]
+    month = _month_index(allocations[ALLOCATION_START])
+    dated = ~np.isnan(month)
+    if not dated.any():
+        print(f"Warning: no resource allocations with a valid {ALLOCATION_START}, skipping the utilisation tabs")
+        return {}
+    first, last = month[dated].min(), month[dated].max()
+    months = np.arange(first, last + 1)
+
+    # Resources tab order first, then resources only seen in allocations
+    resources = resources[resources["resourceId"].notna()].drop_duplicates("resourceId")
+    resource_ids = resources["resourceId"].astype(str).to_numpy()
+    allocation_ids = allocations["resourceId"].astype(str).to_numpy()
+    ids = pd.Index(pd.unique(np.concatenate([resource_ids, allocation_ids])))
+    shape = (len(ids), len(months))
+
+    # Demand matrices in one pass: flat (resource, month) index -> bincount
+    flat = ids.get_indexer(allocation_ids[dated]) * len(months) + (month[dated] - first).astype(int)
+    demand = np.bincount(flat, weights=_numbers(allocations, ALLOCATION_FTE)[dated], minlength=shape[0] * shape[1]).reshape(shape)
+    hours = None
+    if ALLOCATION_HOURS in allocations.columns:
+        hours = np.bincount(flat, weights=_numbers(allocations, ALLOCATION_HOURS)[dated], minlength=shape[0] * shape[1]).reshape(shape)
+
+    # Capacity: known resources get their own or the default value, others stay unknown (NaN)
+    info = resources.set_index(resources["resourceId"].astype(str)).reindex(ids)
+    per_resource = np.full(len(ids), capacity_fte)
+    for column in CAPACITY_COLUMNS:
+        if column in info.columns:
+            values = pd.to_numeric(info[column], errors="coerce").to_numpy(dtype=float)
+            per_resource = np.where(np.isnan(values), per_resource, values)
+            break
+    known = ids.isin(resource_ids)
+    capacity = np.where(known[:, None], per_resource[:, None], np.nan) * np.ones(shape)
+
+    # No capacity before a resource starts or after it leaves
+    if "startDate" in info.columns:
+        capacity[months[None, :] < _month_index(info["startDate"])[:, None]] = 0
+    if "finishDate" in info.columns:
+        capacity[months[None, :] > _month_index(info["finishDate"])[:, None]] = 0
+
+    labels = _month_labels(months)
+    names = info["resourceName"].astype(object) if "resourceName" in info.columns else pd.Series(None, index=ids, dtype=object)
+    if "resourceName" in allocations.columns:
+        # Resources missing from the Resources tab keep the name their allocations carry
+        allocation_names = allocations.drop_duplicates("resourceId").set_index(pd.Index(pd.unique(allocation_ids)))["resourceName"]
+        names = names.fillna(allocation_names.astype(object).reindex(ids))
+    names = names.where(names.notna(), "")
+    team_column = "teamName" if "teamName" in info.columns else "teamId" if "teamId" in info.columns else None
+    teams = info[team_column].astype(object).where(info[team_column].notna(), NO_TEAM) if team_column else pd.Series(NO_TEAM, index=ids)
+
+    resource_columns = _metrics(demand, hours, capacity, threshold, window)
+    resource_tab = _long(
+        {"resourceId": ids, "resourceName": names.to_numpy(), "team": teams.to_numpy()},
+        labels, resource_columns
+    )
+
+    # Teams: sum the resource rows of each team; capacity counts known resources only
+    team_codes, team_names = pd.factorize(teams.to_numpy())
+    def by_team(matrix):
+        return pd.DataFrame(matrix).groupby(team_codes).sum(min_count=1).to_numpy(dtype=float)
+    team_capacity = by_team(capacity)
+    team_columns = _metrics(
+        np.nan_to_num(by_team(demand)), None if hours is None else np.nan_to_num(by_team(hours)),
+        team_capacity, threshold, window
+    )
+    team_columns["overAllocatedResources"] = by_team(resource_columns["overAllocated"].astype(float)).astype(int)
+    team_columns["resources"] = np.repeat(np.bincount(team_codes)[:, None], len(months), axis=1)
+    team_tab = _long({"team": team_names}, labels, team_columns)
+
+    return {RESOURCE_TAB: resource_tab, TEAM_TAB: team_tab}